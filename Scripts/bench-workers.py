@@ -0,0 +1,116 @@
+"""Scaling benchmark for the multi-worker server.
+
+Starts `python -m src.app.serve` once per worker count, drives it with concurrent
+requests and reports throughput and latency percentiles for each run.
+
+Usage:
+    python Scripts/bench-workers.py --workers 1 2 4 8 --concurrency 64 --duration 10
+    python Scripts/bench-workers.py --webhook   # signed empty webhook batch instead of /health
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _webhook_request(secret: str):
+    body = json.dumps({"destination": "bench", "events": []}).encode()
+    signature = base64.b64encode(hmac.new(secret.encode(), body, hashlib.sha256).digest()).decode()
+    return "POST", "/", body, {"X-Line-Signature": signature, "Content-Type": "application/json"}
+
+async def _wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+async def _drive(base_url: str, request, concurrency: int, duration: float):
+    method, path, body, headers = request
+    latencies, errors, pids = [], 0, set()
+    stop_at = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        async def worker():
+            nonlocal errors
+            while time.monotonic() < stop_at:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, content=body, headers=headers)
+                    if response.status_code != 200:
+                        errors += 1
+                    elif path == "/health":
+                        pids.add(response.json()["pid"])
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, pids
+
+def _run(workers: int, args, request) -> dict:
+    env = dict(os.environ, APP_LOG_LEVEL="warning")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "src.app.serve", "--workers", str(workers), "--port", str(args.port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        asyncio.run(_wait_ready(base_url))
+        latencies, errors, pids = asyncio.run(_drive(base_url, request, args.concurrency, args.duration))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / args.duration,
+        "p50_ms": quantiles[49] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "pids_seen": len(pids) if pids else "-",
+    }
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=50105)
+    parser.add_argument("--webhook", action="store_true", help="Send signed empty webhook batches to /")
+    args = parser.parse_args()
+
+    if args.webhook:
+        request = _webhook_request(os.getenv("LINE_CHANNEL_SECRET", ""))
+    else:
+        request = ("GET", "/health", None, {})
+
+    print(f"{'workers':>8} {'requests':>9} {'errors':>7} {'rps':>9} {'p50 ms':>8} {'p99 ms':>8} {'pids':>5}")
+    for workers in args.workers:
+        r = _run(workers, args, request)
+        print(f"{r['workers']:>8} {r['requests']:>9} {r['errors']:>7} {r['rps']:>9.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['pids_seen']:>5}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import hashlib
+from collections import OrderedDict
+from typing import List, Sequence
+import numpy as np
+
+class CachedBatchEmbedder:
+    """Wraps a LangChain `Embeddings` with a content-hash LRU cache and bounded batch sizes.
+
+    Repeated texts (stickers' keywords, greetings, retried deliveries) are embedded once;
+    everything else is sent to the model in chunks of at most `max_batch`.
+    """
+
+    def __init__(self, embeddings, max_batch: int = 32, cache_size: int = 10000):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(kind: str, text: str) -> bytes:
+        return hashlib.blake2b(f"{kind}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+    def _get(self, key: bytes):
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        return vector
+
+    def _put(self, key: bytes, vector: np.ndarray) -> None:
+        self._cache[key] = vector
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def aembed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed `texts` as an (n, dim) float32 array, calling the model only for uncached texts."""
+        keys = [self._key("doc", text) for text in texts]
+        found = {}
+        missing: "OrderedDict[bytes, str]" = OrderedDict()
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            vector = self._get(key)
+            if vector is None:
+                missing[key] = text
+            else:
+                found[key] = vector
+        self.misses += len(missing)
+
+        pending: List[bytes] = list(missing)
+        for start in range(0, len(pending), self.max_batch):
+            chunk = pending[start:start + self.max_batch]
+            vectors = await self.embeddings.aembed_documents([missing[key] for key in chunk])
+            for key, vector in zip(chunk, vectors):
+                found[key] = np.asarray(vector, dtype=np.float32)
+                self._put(key, found[key])
+
+        return np.stack([found[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        key = self._key("query", text)
+        vector = self._get(key)
+        if vector is None:
+            self.misses += 1
+            vector = np.asarray(await self.embeddings.aembed_query(text), dtype=np.float32)
+            self._put(key, vector)
+        return vector
@@ -0,0 +1,34 @@
+import hashlib
+import math
+from typing import List
+from langchain_core.embeddings import Embeddings
+
+class HashingEmbeddings(Embeddings):
+    """Local, deterministic stand-in embedder (no network, no model weights).
+
+    Hashes character n-grams into a fixed number of buckets, which works for Japanese
+    as well as space-delimited text. Useful for tests and for running the chat-history
+    index without an embedding endpoint; retrieval quality is lexical only.
+    """
+
+    def __init__(self, dim: int = 256, ngram: int = 2):
+        self.dim = dim
+        self.ngram = ngram
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        text = text.lower()
+        grams = [text[i:i + self.ngram] for i in range(max(len(text) - self.ngram + 1, 1))]
+        for gram in grams:
+            digest = hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
@@ -0,0 +1,254 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Dict, Optional
+from Utils.Classes.StructuredLogger import Log
+
+################################################################################
+## Cross-process shared state (SQLite WAL)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dedup (
+    key        TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_window (
+    key        TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL,
+    hits       INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_lock (
+    key        TEXT PRIMARY KEY,
+    owner      TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS kv (
+    key        TEXT PRIMARY KEY,
+    value      TEXT NOT NULL,
+    expires_at REAL
+);
+"""
+
+class SharedState:
+    """Small cross-worker state store backed by a single SQLite database in WAL mode.
+
+    Every uvicorn worker opens its own connection (lazily, after fork), so dedup
+    tables, rate-limit counters and per-user ordering locks hold across processes.
+
+    Coroutines must use the `a*` methods and `user_lock`: they run SQLite on one
+    dedicated thread per process, so a busy database never blocks the event loop.
+    The plain methods are for sync code (and that thread).
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._pid = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._last_sweep = 0.0
+        self._key_locks: Dict[str, asyncio.Lock] = {}
+        self._key_waiters: Dict[str, int] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return a connection owned by the current process and thread."""
+        self._check_fork()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _check_fork(self) -> None:
+        if self._pid != os.getpid():
+            # Never reuse a connection, executor thread or lock inherited across fork()
+            self._local = threading.local()
+            self._executor = None
+            self._key_locks = {}
+            self._key_waiters = {}
+            self._pid = os.getpid()
+
+    async def _run(self, func, *args):
+        """Run a blocking store call on this process's dedicated SQLite thread."""
+        self._check_fork()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-state")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(func, *args))
+
+    def _sweep(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired rows at most once per second per process."""
+        if now - self._last_sweep < 1.0:
+            return
+        self._last_sweep = now
+        conn.execute("DELETE FROM dedup WHERE expires_at <= ?", (now,))
+        conn.execute("DELETE FROM rate_window WHERE expires_at <= ?", (now,))
+        conn.execute("DELETE FROM user_lock WHERE expires_at <= ?", (now,))
+        conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def seen(self, key: str, ttl: float = 600.0) -> bool:
+        """Mark `key` as seen. Returns True if another worker already claimed it within `ttl`."""
+        now = time.time()
+        conn = self._connect()
+        self._sweep(conn, now)
+        cursor = conn.execute(
+            "INSERT INTO dedup (key, expires_at) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at "
+            "WHERE dedup.expires_at <= ?",
+            (key, now + ttl, now)
+        )
+        return cursor.rowcount == 0
+
+    def forget(self, key: str) -> None:
+        """Undo `seen`, e.g. when processing failed and a redelivery must go through."""
+        self._connect().execute("DELETE FROM dedup WHERE key = ?", (key,))
+
+    def hit(self, key: str, limit: int, window: float) -> bool:
+        """Count one hit against a fixed-window limit. Returns True if the hit is allowed."""
+        now = time.time()
+        conn = self._connect()
+        self._sweep(conn, now)
+        row = conn.execute(
+            "INSERT INTO rate_window (key, expires_at, hits) VALUES (?, ?, 1) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "  hits = CASE WHEN rate_window.expires_at <= ? THEN 1 ELSE rate_window.hits + 1 END, "
+            "  expires_at = CASE WHEN rate_window.expires_at <= ? THEN excluded.expires_at ELSE rate_window.expires_at END "
+            "RETURNING hits",
+            (key, now + window, now, now)
+        ).fetchone()
+        return row[0] <= limit
+
+    def try_lock(self, key: str, owner: str, lease: float) -> bool:
+        """Try to take (or renew) a lease-based lock. Stale leases are taken over."""
+        now = time.time()
+        conn = self._connect()
+        cursor = conn.execute(
+            "INSERT INTO user_lock (key, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE user_lock.owner = excluded.owner OR user_lock.expires_at <= ?",
+            (key, owner, now + lease, now)
+        )
+        return cursor.rowcount == 1
+
+    def unlock(self, key: str, owner: str) -> None:
+        """Release a lock taken with `try_lock`."""
+        self._connect().execute("DELETE FROM user_lock WHERE key = ? AND owner = ?", (key, owner))
+
+    def get(self, key: str) -> Optional[str]:
+        """Read a value from the shared key/value table."""
+        row = self._connect().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """Write a value to the shared key/value table, optionally expiring after `ttl` seconds."""
+        expires_at = time.time() + ttl if ttl is not None else None
+        self._connect().execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, expires_at)
+        )
+
+    def delete(self, key: str) -> None:
+        """Remove a value from the shared key/value table."""
+        self._connect().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def keys(self, prefix: str) -> list:
+        """List live keys in the shared key/value table starting with `prefix`."""
+        rows = self._connect().execute(
+            "SELECT key FROM kv WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)",
+            (prefix, prefix + "\uffff", time.time())
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    ## ---------------------------------------- async API ----------------------------------------
+
+    async def aseen(self, key: str, ttl: float = 600.0) -> bool:
+        return await self._run(self.seen, key, ttl)
+
+    async def aforget(self, key: str) -> None:
+        await self._run(self.forget, key)
+
+    async def ahit(self, key: str, limit: int, window: float) -> bool:
+        return await self._run(self.hit, key, limit, window)
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await self._run(self.get, key)
+
+    async def aset(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self._run(self.set, key, value, ttl)
+
+    async def adelete(self, key: str) -> None:
+        await self._run(self.delete, key)
+
+    async def akeys(self, prefix: str) -> list:
+        return await self._run(self.keys, prefix)
+
+    @asynccontextmanager
+    async def _key_lock(self, key: str):
+        """In-process serialization per key, so only one task per worker contends in SQLite."""
+        self._check_fork()
+        lock = self._key_locks.setdefault(key, asyncio.Lock())
+        self._key_waiters[key] = self._key_waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._key_waiters[key] -= 1
+            if self._key_waiters[key] == 0:
+                del self._key_waiters[key]
+                del self._key_locks[key]
+
+    @asynccontextmanager
+    async def user_lock(self, key: str, lease: float = 5.0, max_poll: float = 0.25):
+        """Serialize work for one key (e.g. a LINE user) across every worker process.
+
+        The lease is short and renewed by the holder while it works, so a crashed
+        holder blocks other workers for at most `lease` seconds. A lost lease (renewal
+        refused, or failing until the lease runs out) is logged as an error, since
+        another worker may then enter while the holder is still working.
+
+        Waiters in one process queue in arrival order; across processes they poll with
+        backoff, so this is mutual exclusion, not FIFO: which worker goes next is not
+        decided by who asked first.
+        """
+        async with self._key_lock(key):
+            owner = f"{os.getpid()}:{id(asyncio.current_task())}"
+            poll = 0.01
+            while not await self._run(self.try_lock, key, owner, lease):
+                await asyncio.sleep(poll)
+                poll = min(poll * 2, max_poll)
+
+            async def renew():
+                renewed_at = time.monotonic()
+                while True:
+                    await asyncio.sleep(lease / 3)
+                    try:
+                        if not await self._run(self.try_lock, key, owner, lease):
+                            Log["Dramatic"]["error"]("[SharedState] Lost lock lease to another worker:", key)
+                            return
+                        renewed_at = time.monotonic()
+                    except Exception as e:
+                        if time.monotonic() - renewed_at >= lease:
+                            Log["Dramatic"]["error"]("[SharedState] Lock lease expired, renewal failing:", key, str(e))
+                            return
+                        Log["Normal"]["warning"]("[SharedState] Could not renew lock lease; retrying:", key, str(e))
+
+            renewer = asyncio.get_running_loop().create_task(renew())
+            try:
+                yield
+            finally:
+                renewer.cancel()
+                await asyncio.gather(renewer, return_exceptions=True)
+                await self._run(self.unlock, key, owner)
@@ -0,0 +1,224 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Any, Dict, Optional
+
+################################################################################
+## Correlation ids
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+event_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("event_id", default=None)
+
+################################################################################
+## Filters & formatters
+
+class CorrelationFilter(logging.Filter):
+    """Stamp records with the caller's correlation ids (must run before the record leaves the task)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.event_id = event_id_var.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of records per level, e.g. {"DEBUG": 0.1}. Unlisted levels are always kept."""
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+def _to_json(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    return str(value)
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, correlation ids and details."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "event_id", None):
+            entry["event_id"] = record.event_id
+        if getattr(record, "details", None):
+            entry["details"] = list(record.details)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=_to_json)
+
+################################################################################
+## Handlers
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records without formatting them on the caller's thread; drop when the queue is full."""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same process, so no pickling: hand the record over untouched and format in the listener
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+class DevConsoleHandler(logging.Handler):
+    """Opt-in terminal sink: pretty-prints through DramaticLogger/rich from the listener thread."""
+
+    _levels = {
+        logging.DEBUG: "debug",
+        logging.INFO: "info",
+        logging.WARNING: "warning",
+        logging.ERROR: "error",
+        logging.CRITICAL: "critical",
+    }
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            from dramatic_logger import DramaticLogger
+            style = getattr(record, "style", "Normal")
+            level = self._levels.get(record.levelno, "info")
+            details = getattr(record, "details", None) or ()
+            DramaticLogger[style][level](record.getMessage(), *details)
+            if record.exc_info:
+                sys.stderr.write(logging.Formatter().formatException(record.exc_info) + "\n")
+        except Exception:
+            self.handleError(record)
+
+################################################################################
+## Setup
+
+class _Sink:
+    def __init__(self):
+        self.handler: Optional[NonBlockingQueueHandler] = None
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.outputs = ()
+        self.queue_size = 0
+
+    def start(self) -> None:
+        self.handler.queue = queue.Queue(self.queue_size)
+        self.listener = logging.handlers.QueueListener(self.handler.queue, *self.outputs, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self) -> None:
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+_sink = _Sink()
+
+def _parse_rates(spec: str) -> Dict[int, float]:
+    """Parse "DEBUG=0.1,INFO=1" into {logging.DEBUG: 0.1, logging.INFO: 1.0}."""
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, rate = part.split("=", 1)
+        rates[logging.getLevelName(name.strip().upper())] = float(rate)
+    return rates
+
+def configure_logging(
+    level: Optional[str] = None,
+    sample_rates: Optional[str] = None,
+    dev_sink: Optional[bool] = None,
+    log_file: Optional[str] = None,
+    queue_size: Optional[int] = None
+) -> None:
+    """Route all logging through a bounded queue drained by a background thread.
+
+    Defaults come from LOG_LEVEL, LOG_SAMPLE_RATES, LOG_DEV_SINK, LOG_FILE and LOG_QUEUE_SIZE.
+    JSON lines go to LOG_FILE (or stdout); LOG_DEV_SINK=1 adds terminal pretty-printing.
+    """
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    sample_rates = sample_rates if sample_rates is not None else os.getenv("LOG_SAMPLE_RATES", "DEBUG=0.1")
+    dev_sink = dev_sink if dev_sink is not None else os.getenv("LOG_DEV_SINK", "0") == "1"
+    log_file = log_file or os.getenv("LOG_FILE")
+    _sink.queue_size = queue_size or int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        json_handler = logging.FileHandler(log_file, encoding="utf-8")
+    else:
+        json_handler = logging.StreamHandler(sys.stdout)
+    json_handler.setFormatter(JsonLineFormatter())
+    _sink.outputs = (json_handler, DevConsoleHandler()) if dev_sink else (json_handler,)
+
+    _sink.stop()
+    _sink.handler = NonBlockingQueueHandler(None)
+    _sink.handler.addFilter(SamplingFilter(_parse_rates(sample_rates)))
+    _sink.handler.addFilter(CorrelationFilter())
+    _sink.start()
+
+    root = logging.getLogger()
+    root.handlers = [_sink.handler]
+    root.setLevel(level)
+    # Let uvicorn's loggers flow through the same sink instead of their own stream handlers
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+
+def shutdown_logging() -> None:
+    """Flush and stop the background writer (for exits that skip atexit, e.g. os._exit)."""
+    _sink.stop()
+
+def _restart_in_child() -> None:
+    # The listener thread does not survive fork(); give each worker its own queue and thread
+    if _sink.handler is not None:
+        _sink.listener = None
+        _sink.start()
+
+os.register_at_fork(after_in_child=_restart_in_child)
+atexit.register(shutdown_logging)
+
+################################################################################
+## DramaticLogger-style facade
+
+class StructuredLogger:
+    """Drop-in for `DramaticLogger[style][level](message, *details)` that logs through the queue.
+
+    `style` ("Normal"/"Dramatic") is kept on the record so the dev sink can pretty-print it.
+    """
+
+    _levels = {
+        "debug": logging.DEBUG,
+        "info": logging.INFO,
+        "warning": logging.WARNING,
+        "error": logging.ERROR,
+        "critical": logging.CRITICAL,
+    }
+
+    def __init__(self, name: str = "ayaka"):
+        self._logger = logging.getLogger(name)
+        self._styles: Dict[str, Dict[str, Any]] = {}
+
+    def _emitter(self, style: str, levelno: int):
+        def emit(message: str, *details: Any) -> None:
+            if self._logger.isEnabledFor(levelno):
+                self._logger.log(levelno, message, extra={"style": style, "details": details}, stacklevel=2)
+        return emit
+
+    def __getitem__(self, style: str) -> Dict[str, Any]:
+        if style not in self._styles:
+            self._styles[style] = {name: self._emitter(style, levelno) for name, levelno in self._levels.items()}
+        return self._styles[style]
+
+Log = StructuredLogger()
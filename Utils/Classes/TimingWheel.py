@@ -0,0 +1,61 @@
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+class TimingWheel:
+    """TTL map whose expired entries are evicted in O(1) each using time buckets.
+
+    Keys are filed into the bucket for the tick they expire in; as the clock moves
+    forward, each elapsed bucket is dropped wholesale. Expiry is exact on read and
+    at most `tick` seconds late for memory reclamation.
+    """
+
+    def __init__(self, max_ttl: float, tick: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.tick = tick
+        self.clock = clock
+        self._slots = int(max_ttl // tick) + 3
+        self._buckets: List[Set[Hashable]] = [set() for _ in range(self._slots)]
+        self._entries: Dict[Hashable, Tuple[Any, float, int]] = {}  # key -> (value, expires_at, bucket)
+        self._current = int(clock() // tick)
+        self.max_ttl = max_ttl
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _advance(self) -> None:
+        now_tick = int(self.clock() // self.tick)
+        # A full revolution clears every bucket, so never walk more than one
+        for tick in range(self._current + 1, min(now_tick, self._current + self._slots) + 1):
+            bucket = self._buckets[tick % self._slots]
+            for key in bucket:
+                entry = self._entries.get(key)
+                if entry is not None and entry[2] == tick % self._slots:
+                    del self._entries[key]
+            bucket.clear()
+        self._current = max(self._current, now_tick)
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store `value` for `ttl` seconds (capped at `max_ttl`)."""
+        self._advance()
+        ttl = min(self.max_ttl if ttl is None else ttl, self.max_ttl)
+        expires_at = self.clock() + ttl
+        slot = (int(expires_at // self.tick) + 1) % self._slots
+        previous = self._entries.get(key)
+        if previous is not None:
+            self._buckets[previous[2]].discard(key)
+        self._buckets[slot].add(key)
+        self._entries[key] = (value, expires_at, slot)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        self._advance()
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= self.clock():
+            return None
+        return entry[0]
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        self._advance()
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._buckets[entry[2]].discard(key)
+        return entry[0] if entry[1] > self.clock() else None
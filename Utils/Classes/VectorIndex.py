@@ -0,0 +1,116 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from typing import Dict, List, Sequence
+import numpy as np
+
+################################################################################
+## Append-only, memory-mapped vector index
+
+class VectorIndex:
+    """Append-only cosine-similarity index stored in one directory.
+
+    - `vectors.f32`: raw row-major float32 matrix, one L2-normalized row per document
+    - `meta.jsonl`:  one JSON object per row (text and caller metadata)
+    - `meta.idx`:    uint64 byte offset of each row's line in `meta.jsonl`
+
+    Search memory-maps the vector and offset files, so only the rows and metadata
+    lines that are actually touched get paged in. Appends take an exclusive file
+    lock, so several worker processes can share one index.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self._vectors = os.path.join(path, "vectors.f32")
+        self._meta = os.path.join(path, "meta.jsonl")
+        self._offsets = os.path.join(path, "meta.idx")
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        try:
+            return os.path.getsize(self._offsets) // 8
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _truncate(path: str, size: int) -> None:
+        if os.path.exists(path) and os.path.getsize(path) != size:
+            os.truncate(path, size)
+
+    def _repair(self) -> None:
+        """Cut all three files back to the rows they have in common (call under the exclusive lock).
+
+        An append interrupted between files (crash, kill -9) leaves extra bytes in some of
+        them; appending after that would pair vectors with the wrong metadata.
+        """
+        vector_rows = os.path.getsize(self._vectors) // (4 * self.dim) if os.path.exists(self._vectors) else 0
+        rows = min(len(self), vector_rows)
+        meta_end = 0
+        if rows:
+            with open(self._offsets, "rb") as idx, open(self._meta, "rb") as meta:
+                idx.seek((rows - 1) * 8)
+                meta.seek(int(np.frombuffer(idx.read(8), dtype=np.uint64)[0]))
+                meta.readline()
+                meta_end = meta.tell()
+        self._truncate(self._meta, meta_end)
+        self._truncate(self._offsets, rows * 8)
+        self._truncate(self._vectors, rows * 4 * self.dim)
+
+    def add(self, vectors: np.ndarray, metadatas: Sequence[Dict]) -> None:
+        """Append rows; vectors are normalized here so search is a plain dot product."""
+        if not metadatas:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self._locked(exclusive=True):
+            self._repair()
+            # Metadata first, vectors last: a row only becomes searchable once all three files have it
+            with open(self._meta, "ab") as meta:
+                start = meta.tell()
+                lines = [(json.dumps(m, ensure_ascii=False) + "\n").encode("utf-8") for m in metadatas]
+                meta.write(b"".join(lines))
+            offsets = np.cumsum([start] + [len(line) for line in lines[:-1]], dtype=np.uint64)
+            with open(self._offsets, "ab") as idx:
+                idx.write(offsets.tobytes())
+            with open(self._vectors, "ab") as vec:
+                vec.write(vectors.tobytes())
+
+    def search(self, query: np.ndarray, k: int = 4) -> List[Dict]:
+        """Top-k rows by cosine similarity, best first, each with a `score` key."""
+        if not os.path.exists(self._vectors):
+            return []
+        with self._locked(exclusive=False):
+            rows = min(os.path.getsize(self._vectors) // (4 * self.dim), len(self))
+            if rows == 0:
+                return []
+            matrix = np.memmap(self._vectors, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            offsets = np.memmap(self._offsets, dtype=np.uint64, mode="r", shape=(rows,))
+
+            query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+            query = query / (np.linalg.norm(query) or 1.0)
+            scores = matrix @ query
+            k = min(k, rows)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            results = []
+            with open(self._meta, "rb") as meta:
+                for row in top:
+                    meta.seek(int(offsets[row]))
+                    result = json.loads(meta.readline())
+                    result["score"] = float(scores[row])
+                    results.append(result)
+            return results
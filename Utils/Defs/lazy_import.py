@@ -0,0 +1,51 @@
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+
+class _DeferredModule(ModuleType):
+    """Placeholder for a submodule whose parent package is not imported yet.
+
+    Locating a submodule imports its parents, and a parent's `__init__` often imports
+    the submodule too (e.g. `linebot.v3` imports `linebot.v3.webhooks`), so nothing
+    is touched until the first attribute access, which does a regular import.
+    """
+
+    def __getattr__(self, attr: str):
+        module = self.__dict__.get("_module")
+        if module is None:
+            module = self.__dict__["_module"] = importlib.import_module(self.__name__)
+        return getattr(module, attr)
+
+def lazy_import(name: str) -> ModuleType:
+    """Return `name` as a module whose body only executes on first attribute access.
+
+    Already-imported modules are returned as-is, so this is safe to call for modules
+    that may or may not have been loaded eagerly elsewhere.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    parent, _, child = name.rpartition(".")
+    if parent and parent not in sys.modules:
+        return _DeferredModule(name)
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    # find_spec may have run code that imported `name` after all
+    if name in sys.modules:
+        return sys.modules[name]
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    if parent:
+        # A regular import binds the submodule on its parent; keep `pkg.sub is lazy_import("pkg.sub")`
+        setattr(sys.modules[parent], child, module)
+    return module
+
+def is_loaded(name: str) -> bool:
+    """True if `name` has been imported and its body has actually executed."""
+    module = sys.modules.get(name)
+    # type() rather than isinstance(): reading `__class__` would trigger the load
+    return module is not None and not issubclass(type(module), importlib.util._LazyModule)
@@ -1,13 +1,20 @@
-from typing import List, Union, Dict, Any
-from langchain_nvidia_ai_endpoints import ChatNVIDIA, NVIDIAEmbeddings
-from langchain_openai import ChatOpenAI  # Add OpenAI import
-import hjson
+from typing import List, Union, Dict, Any, TYPE_CHECKING
 import json
 import re
-# Add ChatAyaka import
-from Utils.Classes.ChatAyaka import ChatAyaka
 from dotenv import load_dotenv  # Add this import
 import os  # Add this if not already imported
+from Utils.Defs.lazy_import import lazy_import
+
+# Model clients are heavy; defer them until a model is actually configured
+nvidia = lazy_import("langchain_nvidia_ai_endpoints")
+openai = lazy_import("langchain_openai")
+ayaka = lazy_import("Utils.Classes.ChatAyaka")
+hjson = lazy_import("hjson")
+
+if TYPE_CHECKING:
+    from langchain_nvidia_ai_endpoints import ChatNVIDIA, NVIDIAEmbeddings
+    from langchain_openai import ChatOpenAI
+    from Utils.Classes.ChatAyaka import ChatAyaka
 
 # Load environment variables from .env file
 load_dotenv()
@@ -25,9 +32,9 @@ def _load_jsonc(file_path: str) -> dict:
         raise ValueError(f"Error parsing JSONC file {file_path}: {str(e)}")
 
 def apply_model_configs(
-    models: List[Union[ChatNVIDIA, NVIDIAEmbeddings, ChatAyaka, ChatOpenAI]], 
+    models: List[Union["ChatNVIDIA", "NVIDIAEmbeddings", "ChatAyaka", "ChatOpenAI"]], 
     config_file: str = "./Configs/TC3.ModelConfig.jsonc"
-) -> List[Union[ChatNVIDIA, NVIDIAEmbeddings, ChatAyaka, ChatOpenAI]]:
+) -> List[Union["ChatNVIDIA", "NVIDIAEmbeddings", "ChatAyaka", "ChatOpenAI"]]:
     """
     Apply configurations from a JSONC file to a list of models.
     Only applies parameters that are supported by the model.
@@ -41,10 +48,10 @@ def apply_model_configs(
     
     for model in models:
         # Determine model type and name from the instance
-        if isinstance(model, (ChatNVIDIA, ChatAyaka, ChatOpenAI)):
+        if isinstance(model, (nvidia.ChatNVIDIA, ayaka.ChatAyaka, openai.ChatOpenAI)):
             model_type = "llm"
             # Get model name based on model type
-            if isinstance(model, ChatOpenAI):
+            if isinstance(model, openai.ChatOpenAI):
                 model_attr = model.model_name
             else:
                 model_attr = model.model
@@ -78,7 +85,7 @@ def apply_model_configs(
                 if config_value is not None:
                     setattr(model, model_name, config_value)
                 
-        elif isinstance(model, NVIDIAEmbeddings):
+        elif isinstance(model, nvidia.NVIDIAEmbeddings):
             # Determine if it's Japanese or English embedder
             if model.model == config["Embedder_Models"]["embedder_model_jp"]:
                 model_name = "jp"
@@ -100,7 +107,7 @@ def apply_model_configs(
 def get_configured_model(
     model_type: str,
     config_file: str = "./Configs/Default.ModelConfig.jsonc"
-) -> Union[ChatNVIDIA, NVIDIAEmbeddings, ChatAyaka, ChatOpenAI]:
+) -> Union["ChatNVIDIA", "NVIDIAEmbeddings", "ChatAyaka", "ChatOpenAI"]:
     """
     Create and configure a new model instance.
     
@@ -121,18 +128,18 @@ def get_configured_model(
         model_name = config["LLM_Models"][f"llm_{model_type}_model"]
         
         if model_function == "ChatAyaka":
-            model = ChatAyaka(
+            model = ayaka.ChatAyaka(
                 nvidia_api_url=config["NetLocations"][f"llm_{model_type}_base_url"],
                 model=model_name
             )
         elif model_function == "ChatOpenAI":
             # For OpenAI, we use api_key from environment variable OPENAI_API_KEY
-            model = ChatOpenAI(
+            model = openai.ChatOpenAI(
                 model=model_name,
                 api_key=config.get("API_Keys", {}).get("openai_api_key")  # Optional from config
             )
         else:  # Default to ChatNVIDIA
-            model = ChatNVIDIA(
+            model = nvidia.ChatNVIDIA(
                 base_url=config["NetLocations"][f"llm_{model_type}_base_url"],
                 model=model_name
             )
@@ -141,7 +148,7 @@ def get_configured_model(
         
     elif model_type in ["embedder_jp", "embedder_eng"]:
         lang = model_type.split('_')[1]
-        model = NVIDIAEmbeddings(
+        model = nvidia.NVIDIAEmbeddings(
             base_url=config["NetLocations"][f"embedder_base_url_{lang}"],
             model=config["Embedder_Models"][f"embedder_model_{lang}"],
             truncate="NONE"
@@ -1,14 +1,29 @@
-from langchain.schema.runnable import RunnableLambda
+import logging
 from functools import partial
-from rich.console import Console
-from rich.style import Style
-from functools import partial
-from Utils.Defs.pprint import pprint
+from Utils.Defs.lazy_import import lazy_import
+
+runnables = lazy_import("langchain_core.runnables")
+
+# Debug printing in pipelines is gated on this logger's level
+pipeline_logger = logging.getLogger("pipeline")
+
+def rprint_enabled(level=logging.DEBUG):
+    """True if RPrint steps should be added to pipelines at `level`. Checked when a chain is built."""
+    return pipeline_logger.isEnabledFor(level)
 
 def RPrint(preface=""):
-    """Simple passthrough "prints, then returns" chain"""
+    """Simple passthrough "prints, then returns" chain.
+
+    The value is handed to the logging sink; pretty-printing (rich) only happens in the
+    opt-in dev sink, on the sink's background thread.
+    """
     def print_and_return(x, preface):
-        if preface: print("\n\n" + "\033[1m" + "\033[35m" + preface + "\033[0m", end="")
-        pprint(x)
+        pipeline_logger.debug(preface, extra={"style": "Dramatic", "details": (x,)})
         return x
-    return RunnableLambda(partial(print_and_return, preface=preface))
+    async def aprint_and_return(x, preface):
+        return print_and_return(x, preface)
+    return runnables.RunnableLambda(
+        partial(print_and_return, preface=preface),
+        afunc=partial(aprint_and_return, preface=preface),
+        name="RPrint"
+    )
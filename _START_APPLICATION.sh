@@ -2,5 +2,5 @@
 clear
 # Kill any processes running on port 50005
 sudo fuser -k 50005/tcp
-# Start the application
-uvicorn src.app.main:app --host 0.0.0.0 --port 50005 --reload --reload-dir src
+# Start the application (dev: full debug logging, pretty-printed to the terminal)
+LOG_LEVEL=DEBUG LOG_SAMPLE_RATES="DEBUG=1" LOG_DEV_SINK=1 uvicorn src.app.main:app --host 0.0.0.0 --port 50005 --reload --reload-dir src
@@ -0,0 +1,6 @@
+#!/bin/bash
+# Kill any processes running on port 50005
+sudo fuser -k 50005/tcp
+# Start the application: preloaded multi-worker server (SO_REUSEPORT, graceful drain on SIGTERM)
+# Worker count defaults to the CPU count; override with APP_WORKERS
+exec python -m src.app.serve --host 0.0.0.0 --port 50005
@@ -1,26 +1,11 @@
-from typing import Dict, Any
-from dramatic_logger import DramaticLogger
-from linebot.v3.webhooks import (
-    MessageEvent, 
-    TextMessageContent,
-    ImageMessageContent,
-    VideoMessageContent,
-    AudioMessageContent,
-    LocationMessageContent,
-    StickerMessageContent,
-    FileMessageContent
-)
-from linebot.v3.messaging import (
-    ApiClient,
-    Configuration,
-    MessagingApi,
-    ReplyMessageRequest,
-    TextMessage
-)
+from typing import Dict, Any, List, Optional, Callable, AsyncContextManager, TYPE_CHECKING
+from contextlib import nullcontext
+from Utils.Classes.StructuredLogger import Log, event_id_var
 from fastapi import HTTPException
-from langchain_core.runnables import RunnableLambda, RunnablePassthrough
-from langchain.schema.runnable.passthrough import RunnableAssign
 from datetime import datetime
+from .channels import channel_registry, DEFAULT_CHANNEL_ID
+from .reply_registry import reply_registry
+from .history import HISTORY_EMBEDDER, get_history_indexer
 from .models import (
     ProviderMessage, 
     TextContent,
@@ -32,43 +17,56 @@ from .models import (
     FileContent
 )
 
-from Utils.Runnables.RPrint import RPrint
+from Utils.Defs.lazy_import import lazy_import
+from Utils.Runnables.RPrint import RPrint, rprint_enabled
+from functools import reduce
+import operator
 import httpx
 import os
 
-def parse_line_message(message_event: MessageEvent) -> ProviderMessage:
+# Heavy modules are deferred until first use to keep worker cold start small
+webhooks = lazy_import("linebot.v3.webhooks")
+messaging = lazy_import("linebot.v3.messaging")
+runnables = lazy_import("langchain_core.runnables")
+
+if TYPE_CHECKING:
+    from linebot.v3.webhooks import MessageEvent
+
+ORCHESTRATOR_URL = os.getenv("ORCHESTRATOR_URL", "http://127.0.0.1:40443/process")
+
+def parse_line_message(message_event: "MessageEvent", channel_id: str = DEFAULT_CHANNEL_ID) -> ProviderMessage:
     """Convert LINE message to standardized format"""
     base_content = {
         "raw_content": message_event.message.dict()
     }
     
     # Parse different message types
-    if isinstance(message_event.message, TextMessageContent):
+    if isinstance(message_event.message, webhooks.TextMessageContent):
         content = TextContent(
             **base_content,
             text=message_event.message.text
         )
-    elif isinstance(message_event.message, ImageContent):
+    elif isinstance(message_event.message, webhooks.ImageMessageContent):
         content = ImageContent(
             **base_content,
             content_provider=message_event.message.content_provider.dict(),
             url=None  # LINE doesn't provide direct URLs
         )
-    elif isinstance(message_event.message, VideoMessageContent):
+    elif isinstance(message_event.message, webhooks.VideoMessageContent):
         content = VideoContent(
             **base_content,
             content_provider=message_event.message.content_provider.dict(),
             duration=message_event.message.duration,
             url=None
         )
-    elif isinstance(message_event.message, AudioMessageContent):
+    elif isinstance(message_event.message, webhooks.AudioMessageContent):
         content = AudioContent(
             **base_content,
             content_provider=message_event.message.content_provider.dict(),
             duration=message_event.message.duration,
             url=None
         )
-    elif isinstance(message_event.message, LocationMessageContent):
+    elif isinstance(message_event.message, webhooks.LocationMessageContent):
         content = LocationContent(
             **base_content,
             title=message_event.message.title,
@@ -76,14 +74,14 @@ def parse_line_message(message_event: MessageEvent) -> ProviderMessage:
             latitude=message_event.message.latitude,
             longitude=message_event.message.longitude
         )
-    elif isinstance(message_event.message, StickerMessageContent):
+    elif isinstance(message_event.message, webhooks.StickerMessageContent):
         content = StickerContent(
             **base_content,
             package_id=message_event.message.package_id,
             sticker_id=message_event.message.sticker_id,
             keywords=message_event.message.keywords
         )
-    elif isinstance(message_event.message, FileMessageContent):
+    elif isinstance(message_event.message, webhooks.FileMessageContent):
         content = FileContent(
             **base_content,
             filename=message_event.message.file_name,
@@ -103,131 +101,201 @@ def parse_line_message(message_event: MessageEvent) -> ProviderMessage:
         thread_id=None,  # LINE doesn't have thread IDs
         metadata={
             "source_type": message_event.source.type,
-            "mode": message_event.mode
+            "mode": message_event.mode,
+            "channel_id": channel_id
         }
     )
 
-class SendMessageTextV2:
-    def __init__(self, line_bot_api):
-        self.line_bot_api = line_bot_api
-
-    def __call__(self, provider_message: ProviderMessage) -> ProviderMessage:
-        """Send message back to LINE using V2 API"""
-        try:
-            # Extract the text from the standardized message
-            if isinstance(provider_message.content, TextContent):
-                text = provider_message.content.text
-            else:
-                text = f"Received {provider_message.content.type} message"
-
-            self.line_bot_api.reply_message(
-                ReplyMessageRequest(
-                    reply_token=provider_message.reply_token,
-                    messages=[TextMessage(text=f"Echo: {text}")]
-                )
-            )
-            return provider_message
-        except Exception as e:
-            DramaticLogger["Dramatic"]["error"](f"Error sending LINE message:", str(e))
-            raise HTTPException(status_code=500, detail=f"Error sending LINE message: {str(e)}")
+## ========================================-------------========================================
+## ---------------------------------------- CLIENT POOLS ---------------------------------------
+## ========================================-------------========================================
 
-async def send_to_orchestrator(provider_message: ProviderMessage) -> ProviderMessage:
-    """Send message to orchestrator and get response"""
-    try:
-        # Convert to dict and ensure datetime is serialized
-        message_dict = provider_message.dict()
-        # Convert datetime to ISO format string
-        message_dict["timestamp"] = provider_message.timestamp.isoformat()
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "http://127.0.0.1:40443/process",  # Orchestrator endpoint
-                json=message_dict,
-                timeout=30.0
-            )
-            response.raise_for_status()
-            
-            # Parse response back into ProviderMessage
-            response_data = response.json()
-            # Convert ISO string back to datetime
-            response_data["timestamp"] = datetime.fromisoformat(response_data["timestamp"])
-            return ProviderMessage.parse_obj(response_data)
-            
-    except Exception as e:
-        DramaticLogger["Dramatic"]["error"](f"Error communicating with orchestrator:", str(e))
-        # For now, just echo back the original message if orchestrator fails
-        return provider_message
+# Created lazily inside each worker process (never before fork) and shared by every channel
+_orchestrator_client: Optional[httpx.AsyncClient] = None
 
-def create_receive_chain(line_bot_api):
-    """Chain for receiving messages from LINE and sending to orchestrator"""
-    return (
-        # Parse LINE message to standard format
-        RunnableLambda(parse_line_message)
-        | RPrint(preface="Parsed LINE message:")
-        # Send to orchestrator
-        | RunnableLambda(send_to_orchestrator)
-    )
+def get_orchestrator_client() -> httpx.AsyncClient:
+    """Pooled keep-alive client for the orchestrator"""
+    global _orchestrator_client
+    if _orchestrator_client is None:
+        _orchestrator_client = httpx.AsyncClient(timeout=60.0)  # Orchestrator may take a while
+    return _orchestrator_client
 
-def create_send_chain(line_bot_api):
-    """Chain for receiving orchestrator response and sending to LINE"""
-    return (
-        RPrint(preface="Orchestrator response:")
-        # Send response back to LINE using V2 API
-        | RunnableLambda(SendMessageTextV2(line_bot_api))
-    )
+async def close_clients() -> None:
+    """Close pooled clients on shutdown"""
+    global _orchestrator_client
+    if _orchestrator_client is not None:
+        await _orchestrator_client.aclose()
+        _orchestrator_client = None
+    await channel_registry.close()
+
+## ========================================----------------========================================
+## ---------------------------------------- PIPELINE STAGES ---------------------------------------
+## ========================================----------------========================================
+
+async def aparse_line_event(event: Dict[str, Any], config: Dict[str, Any]) -> ProviderMessage:
+    """Parse a raw webhook event dict into the standardized format, tagged with its channel"""
+    channel_id = config.get("configurable", {}).get("channel_id", DEFAULT_CHANNEL_ID)
+    provider_message = parse_line_message(webhooks.MessageEvent.from_dict(event), channel_id)
+    # Remember the reply token so the orchestrator can answer with just the message_id
+    if provider_message.reply_token:
+        await reply_registry.register(
+            provider_message.message_id,
+            provider_message.reply_token,
+            provider_message.user_id,
+            channel_id
+        )
+    return provider_message
+
+async def forward_to_orchestrator(provider_message: ProviderMessage) -> Dict[str, Any]:
+    """Send a parsed message to the orchestrator"""
+    # Convert to dict and ensure datetime is serialized
+    message_dict = provider_message.dict(exclude_none=True)
+    message_dict["timestamp"] = provider_message.timestamp.isoformat()
 
-async def route_line_message(message_event: MessageEvent, line_bot_api) -> Dict[str, Any]:
-    """Route incoming LINE message to orchestrator"""
     try:
-        # Parse LINE message to standard format
-        provider_message = parse_line_message(message_event)
-        DramaticLogger["Normal"]["info"](f"Parsed LINE message from user {message_event.source.user_id}")
-        
-        # Convert to dict and ensure datetime is serialized
-        message_dict = provider_message.dict(exclude_none=True)
-        message_dict["timestamp"] = provider_message.timestamp.isoformat()
-        
-        # Send to orchestrator with longer timeout
-        async with httpx.AsyncClient(timeout=60.0) as client:  # Increased timeout
-            try:
-                response = await client.post(
-                    "http://127.0.0.1:40443/process",
-                    json=message_dict
-                )
-                response.raise_for_status()
-                
-                return {"status": "success", "message": "Message routed to orchestrator"}
-                
-            except httpx.TimeoutException:
-                DramaticLogger["Normal"]["info"]("Orchestrator processing message (timeout is expected)")
-                return {"status": "success", "message": "Message sent to orchestrator for processing"}
-            
-    except Exception as e:
-        DramaticLogger["Dramatic"]["error"](f"Error routing message:", str(e))
-        raise HTTPException(status_code=500, detail=str(e))
+        response = await get_orchestrator_client().post(ORCHESTRATOR_URL, json=message_dict)
+        response.raise_for_status()
+        Log["Normal"]["info"]("Routed LINE message from user", provider_message.user_id)
+        return {"status": "success", "message": "Message routed to orchestrator"}
+    except httpx.TimeoutException:
+        Log["Normal"]["info"]("Orchestrator processing message (timeout is expected)")
+        return {"status": "success", "message": "Message sent to orchestrator for processing"}
 
-async def send_line_message(provider_message: ProviderMessage) -> Dict[str, Any]:
+async def reply_line_message(provider_message: ProviderMessage) -> Dict[str, Any]:
     """Send message from orchestrator to LINE user"""
     try:
-        line_bot_api = MessagingApi(ApiClient(Configuration(
-            access_token=os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
-        )))
-        
         # Extract text from standardized message
         if isinstance(provider_message.content, TextContent):
             text = provider_message.content.text
         else:
             text = f"Received {provider_message.content.type} message"
 
-        # Send to LINE
-        line_bot_api.reply_message(
-            ReplyMessageRequest(
-                reply_token=provider_message.reply_token,
-                messages=[TextMessage(text=text)]
+        # Send to LINE through the channel the message came in on
+        channel_id = (provider_message.metadata or {}).get("channel_id")
+        channel = channel_registry.get(channel_id)
+        if channel is None:
+            raise ValueError(f"Unknown LINE channel: {channel_id or DEFAULT_CHANNEL_ID}")
+        async with channel.client() as api:
+            await api.reply_message(
+                messaging.ReplyMessageRequest(
+                    reply_token=provider_message.reply_token,
+                    messages=[messaging.TextMessage(text=text)]
+                )
             )
-        )
         return {"status": "success", "message": "Message sent to LINE"}
-        
+
     except Exception as e:
-        DramaticLogger["Dramatic"]["error"](f"Error sending LINE message:", str(e))
+        Log["Dramatic"]["error"](f"Error sending LINE message:", str(e))
         raise HTTPException(status_code=500, detail=str(e))
+
+## ========================================-----------========================================
+## ---------------------------------------- PIPELINES ---------------------------------------
+## ========================================-----------========================================
+
+def _pipe(*steps):
+    """Compose runnables, skipping disabled (None) steps so they cost nothing"""
+    return reduce(operator.or_, [step for step in steps if step is not None])
+
+def _debug(preface: str):
+    return RPrint(preface=preface) if rprint_enabled() else None
+
+def _index_history():
+    """Hand text messages to the chat-history indexer (non-blocking); absent when indexing is off"""
+    if not HISTORY_EMBEDDER:
+        return None
+    async def submit(provider_message: ProviderMessage) -> ProviderMessage:
+        # Looked up per call: the chain may be built before fork, the embedder client must not be
+        get_history_indexer().submit(provider_message)
+        return provider_message
+    return runnables.RunnableLambda(submit, name="index_chat_history")
+
+def create_receive_chain():
+    """Chain for receiving messages from LINE and sending to orchestrator"""
+    return _pipe(
+        # Parse LINE message to standard format
+        runnables.RunnableLambda(aparse_line_event, name="parse_line_event"),
+        _debug("Parsed LINE message:"),
+        _index_history(),
+        # Send to orchestrator
+        runnables.RunnableLambda(forward_to_orchestrator, name="forward_to_orchestrator"),
+    ).with_types(input_type=Dict[str, Any], output_type=Dict[str, Any])
+
+def create_send_chain():
+    """Chain for receiving orchestrator response and sending to LINE"""
+    return _pipe(
+        _debug("Orchestrator response:"),
+        # Send response back to LINE
+        runnables.RunnableLambda(reply_line_message, name="reply_line_message"),
+    ).with_types(input_type=ProviderMessage, output_type=Dict[str, Any])
+
+_receive_chain = None
+_send_chain = None
+
+def get_receive_chain():
+    """Receive pipeline, built once per process"""
+    global _receive_chain
+    if _receive_chain is None:
+        _receive_chain = create_receive_chain()
+    return _receive_chain
+
+def get_send_chain():
+    """Send pipeline, built once per process"""
+    global _send_chain
+    if _send_chain is None:
+        _send_chain = create_send_chain()
+    return _send_chain
+
+async def route_line_events(
+    events: List[Dict[str, Any]],
+    channel_id: str,
+    max_concurrency: int,
+    user_lock: Optional[Callable[[str], AsyncContextManager]] = None
+) -> List[Dict[str, Any]]:
+    """Run a webhook batch through the receive pipeline.
+
+    Events from different users run concurrently (capped at `max_concurrency`);
+    events from the same user run in order, holding `user_lock(user_id)` if given.
+    Once one of a user's events fails, that user's later events are reported as
+    errors without running, so a redelivery replays them in order.
+    """
+    receive_chain = get_receive_chain()
+    config = {"configurable": {"channel_id": channel_id}}
+
+    # Group by user, remembering each event's position in the batch
+    groups: Dict[str, List[tuple]] = {}
+    for index, event in enumerate(events):
+        user_id = event.get("source", {}).get("userId", "")
+        groups.setdefault(user_id, []).append((index, event))
+
+    async def run_group(group: List[tuple]) -> List[tuple]:
+        user_id = group[0][1].get("source", {}).get("userId", "")
+        results = []
+        async with (user_lock(user_id) if user_lock else nullcontext()):
+            failed = False
+            for index, event in group:
+                if failed:
+                    # Redelivery must replay this user's events in order, so nothing after a failure runs
+                    results.append((index, {"status": "error", "message": "Skipped after an earlier event from this user failed"}))
+                    continue
+                event_id_var.set(event.get("webhookEventId"))
+                try:
+                    results.append((index, await receive_chain.ainvoke(event, config=config)))
+                except Exception as e:
+                    Log["Dramatic"]["error"](f"Error routing message:", str(e))
+                    results.append((index, {"status": "error", "message": str(e)}))
+                    failed = True
+        return results
+
+    batches = await runnables.RunnableLambda(run_group, name="route_user_events").abatch(
+        list(groups.values()),
+        config={"max_concurrency": max_concurrency}
+    )
+    responses: List[Optional[Dict[str, Any]]] = [None] * len(events)
+    for batch in batches:
+        for index, response in batch:
+            responses[index] = response
+    return responses
+
+async def send_line_message(provider_message: ProviderMessage) -> Dict[str, Any]:
+    """Send message from orchestrator to LINE user"""
+    return await get_send_chain().ainvoke(provider_message)
@@ -0,0 +1,22 @@
+import hmac
+import os
+from typing import Optional
+from fastapi import Header, HTTPException
+
+def _require_bearer(env_var: str, authorization: Optional[str]) -> None:
+    """`Authorization: Bearer $<env_var>`; the guarded routes are off (404) when the variable is unset"""
+    expected = os.getenv(env_var)
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+def require_admin(authorization: Optional[str] = Header(default=None)) -> None:
+    """Guard for admin routes: `Authorization: Bearer $ADMIN_TOKEN`. Admin routes are off when unset."""
+    _require_bearer("ADMIN_TOKEN", authorization)
+
+def require_history_token(authorization: Optional[str] = Header(default=None)) -> None:
+    """Guard for chat-history retrieval: `Authorization: Bearer $HISTORY_TOKEN`, kept separate from
+    ADMIN_TOKEN so the orchestrator never holds admin rights. Retrieval is off when unset."""
+    _require_bearer("HISTORY_TOKEN", authorization)
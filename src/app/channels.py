@@ -0,0 +1,186 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set
+from Utils.Classes.SharedState import SharedState
+from Utils.Classes.StructuredLogger import Log
+from Utils.Defs.lazy_import import lazy_import
+from .models import LineChannelConfig
+from .state import shared_state
+
+messaging = lazy_import("linebot.v3.messaging")
+
+DEFAULT_CHANNEL_ID = os.getenv("LINE_CHANNEL_ID", "default")
+
+class LineChannel:
+    """A registered LINE channel: signature key, pooled outbound client and rate limits"""
+
+    def __init__(self, config: LineChannelConfig):
+        self.config = config
+        self._secret = config.channel_secret.encode("utf-8")
+        self._api = None
+        self._in_use = 0
+
+    @property
+    def channel_id(self) -> str:
+        return self.config.channel_id
+
+    def verify(self, body: bytes, signature: str) -> bool:
+        """Check X-Line-Signature (base64 HMAC-SHA256 of the raw body)"""
+        digest = hmac.new(self._secret, body, hashlib.sha256).digest()
+        return hmac.compare_digest(base64.b64encode(digest), signature.encode("utf-8"))
+
+    @property
+    def api(self):
+        """Pooled async Messaging API client, created on first use inside the worker"""
+        if self._api is None:
+            self._api = messaging.AsyncMessagingApi(messaging.AsyncApiClient(messaging.Configuration(
+                access_token=self.config.access_token
+            )))
+        return self._api
+
+    @asynccontextmanager
+    async def client(self):
+        """Borrow the Messaging API client for one call; a replaced channel is closed only once idle"""
+        self._in_use += 1
+        try:
+            yield self.api
+        finally:
+            self._in_use -= 1
+
+    @property
+    def idle(self) -> bool:
+        return self._in_use == 0
+
+    async def close(self) -> None:
+        if self._api is not None:
+            await self._api.api_client.close()
+            self._api = None
+
+class ChannelRegistry:
+    """Channels indexed by id and by webhook `destination`.
+
+    Runtime changes are written to shared state, so every worker picks them up
+    without a restart: a background task re-reads them every `sync_interval`
+    (off the event loop), and lookups only touch the in-memory index.
+    """
+
+    _key_prefix = "line:channel:"
+    _version_key = "line:channels:version"
+
+    def __init__(self, state: SharedState, sync_interval: float = 1.0):
+        self.state = state
+        self.sync_interval = sync_interval
+        self._by_id: Dict[str, LineChannel] = {}
+        self._by_destination: Dict[str, LineChannel] = {}
+        self._retired: List[LineChannel] = []
+        self._closing: Set[asyncio.Task] = set()
+        self._version: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _index(self, configs: List[LineChannelConfig]) -> None:
+        by_id = {}
+        for config in configs:
+            current = self._by_id.get(config.channel_id)
+            # Keep the existing pooled client when a channel's config has not changed
+            by_id[config.channel_id] = current if current and current.config == config else LineChannel(config)
+        self._retired.extend(channel for cid, channel in self._by_id.items() if by_id.get(cid) is not channel)
+        self._by_id = by_id
+        self._by_destination = {c.config.destination: c for c in by_id.values() if c.config.destination}
+
+    def _reap(self) -> None:
+        """Close the clients of replaced channels that no request is using any more"""
+        idle = [channel for channel in self._retired if channel.idle]
+        self._retired = [channel for channel in self._retired if not channel.idle]
+        for channel in idle:
+            task = asyncio.get_running_loop().create_task(channel.close())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def _refresh(self, force: bool = False) -> None:
+        version = await self.state.aget(self._version_key)
+        if version != self._version or force:
+            configs = []
+            for key in await self.state.akeys(self._key_prefix):
+                raw = await self.state.aget(key)
+                if raw:
+                    configs.append(LineChannelConfig.model_validate_json(raw))
+            self._index(configs)
+            self._version = version
+        self._reap()
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self._refresh()
+            except Exception as e:
+                Log["Dramatic"]["error"]("Error syncing LINE channels:", str(e))
+
+    async def start(self) -> None:
+        """Load the channels, then keep them in sync in the background (once per worker, at startup)"""
+        await self._refresh(force=True)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+
+    async def _bump_version(self) -> None:
+        await self.state.aset(self._version_key, f"{os.getpid()}:{time.time_ns()}")
+
+    async def add(self, config: LineChannelConfig) -> LineChannel:
+        """Register (or replace) a channel for every worker"""
+        await self.state.aset(self._key_prefix + config.channel_id, config.model_dump_json())
+        await self._bump_version()
+        await self._refresh(force=True)
+        return self._by_id[config.channel_id]
+
+    async def remove(self, channel_id: str) -> bool:
+        """Unregister a channel for every worker"""
+        if await self.state.aget(self._key_prefix + channel_id) is None:
+            return False
+        await self.state.adelete(self._key_prefix + channel_id)
+        await self._bump_version()
+        await self._refresh(force=True)
+        return True
+
+    def get(self, channel_id: Optional[str]) -> Optional[LineChannel]:
+        return self._by_id.get(channel_id or DEFAULT_CHANNEL_ID)
+
+    def by_destination(self, destination: Optional[str]) -> Optional[LineChannel]:
+        return self._by_destination.get(destination) if destination else None
+
+    def list(self) -> List[LineChannelConfig]:
+        return [channel.config for channel in self._by_id.values()]
+
+    async def load_env_default(self) -> None:
+        """Register the channel from LINE_CHANNEL_SECRET/LINE_CHANNEL_ACCESS_TOKEN, if set"""
+        secret, token = os.getenv("LINE_CHANNEL_SECRET"), os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
+        if not (secret and token):
+            return
+        config = LineChannelConfig(
+            channel_id=DEFAULT_CHANNEL_ID,
+            channel_secret=secret,
+            access_token=token,
+            destination=os.getenv("LINE_CHANNEL_DESTINATION"),
+            user_rate_limit=int(os.getenv("LINE_USER_RATE_LIMIT", 30)),
+            user_rate_window=float(os.getenv("LINE_USER_RATE_WINDOW_SECONDS", 60)),
+        )
+        existing = self.get(DEFAULT_CHANNEL_ID)
+        if existing is None or existing.config != config:
+            await self.add(config)
+
+    async def close(self) -> None:
+        """Stop syncing and close every pooled outbound client, including those of replaced channels"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for channel in list(self._by_id.values()) + self._retired:
+            await channel.close()
+        self._retired = []
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+channel_registry = ChannelRegistry(shared_state)
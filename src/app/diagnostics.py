@@ -0,0 +1,216 @@
+"""On-demand profiling and memory diagnostics (admin token required).
+
+Nothing here runs until a route is called: the CPU sampler and loop watchdog are
+short-lived threads bounded by `seconds`, and tracemalloc is only on between
+start and stop, for at most `max_seconds`. Every response names the worker that
+answered (`X-Worker-PID` header, and `pid` in JSON bodies).
+"""
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse
+from .admin import require_admin
+
+def _tag_worker(response: Response) -> None:
+    response.headers["X-Worker-PID"] = str(os.getpid())
+
+router = APIRouter(prefix="/admin/diag", dependencies=[Depends(require_admin), Depends(_tag_worker)])
+
+# One sampling session at a time; a second caller gets 409 instead of doubling the overhead
+_session_lock = threading.Lock()
+
+def _collapse(frame, limit: int = 128) -> str:
+    """Render a frame's stack root-first as `file:function;file:function;...`"""
+    names = []
+    while frame is not None and len(names) < limit:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+def _exclusive(func):
+    def run(*args, **kwargs):
+        if not _session_lock.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="Another diagnostics session is running")
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _session_lock.release()
+    return run
+
+## ========================================-------------========================================
+## ---------------------------------------- CPU PROFILE ---------------------------------------
+## ========================================-------------========================================
+
+@_exclusive
+def _sample_stacks(seconds: float, interval: float) -> Counter:
+    """Sample every thread's stack (except this one) every `interval` seconds"""
+    own = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks: Counter = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident != own:
+                stacks[f"{names.get(ident, ident)};{_collapse(frame)}"] += 1
+        time.sleep(interval)
+    return stacks
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def cpu_profile(
+    seconds: float = Query(10.0, gt=0, le=120),
+    interval_ms: float = Query(5.0, ge=1, le=1000)
+):
+    """Sampling CPU profile in collapsed-stack format (pipe into flamegraph.pl or speedscope)"""
+    stacks = await asyncio.to_thread(_sample_stacks, seconds, interval_ms / 1000)
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+## ========================================-------------========================================
+## ---------------------------------------- TRACEMALLOC ---------------------------------------
+## ========================================-------------========================================
+
+_snapshot: Optional[tracemalloc.Snapshot] = None
+_auto_stop: Optional[asyncio.TimerHandle] = None
+
+def _session_worker(pid: int = Query(..., description="`pid` returned by /tracemalloc/start")) -> None:
+    """tracemalloc sessions span several requests, which may land on any worker; a request
+    that reaches a different process than the one that started the session gets 409, so the
+    caller can retry until it reaches the right one"""
+    if pid != os.getpid():
+        raise HTTPException(
+            status_code=409,
+            detail=f"tracemalloc session belongs to worker {pid}, this is worker {os.getpid()}; retry"
+        )
+
+def _filtered(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    return snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+
+def _stop_tracing() -> None:
+    global _snapshot, _auto_stop
+    if _auto_stop is not None:
+        _auto_stop.cancel()
+        _auto_stop = None
+    tracemalloc.stop()
+    _snapshot = None
+
+@router.post("/tracemalloc/start")
+async def tracemalloc_start(
+    max_seconds: float = Query(..., gt=0, le=3600),
+    frames: int = Query(10, ge=1, le=64)
+):
+    """Start tracing allocations in this worker (adds overhead to every allocation); stops by itself
+    after `max_seconds`. Pass the returned `pid` to snapshot and stop."""
+    global _snapshot, _auto_stop
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _snapshot = None
+    if _auto_stop is not None:
+        _auto_stop.cancel()
+    _auto_stop = asyncio.get_running_loop().call_later(max_seconds, _stop_tracing)
+    return {
+        "status": "OK",
+        "pid": os.getpid(),
+        "tracing": True,
+        "frames": tracemalloc.get_traceback_limit(),
+        "max_seconds": max_seconds,
+    }
+
+@router.post("/tracemalloc/snapshot", dependencies=[Depends(_session_worker)])
+async def tracemalloc_snapshot(
+    top: int = Query(25, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    """Top allocators now, plus the diff against the previous snapshot (if any)"""
+    global _snapshot
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=409, detail="tracemalloc is not running; POST /admin/diag/tracemalloc/start first")
+    snapshot = _filtered(await asyncio.to_thread(tracemalloc.take_snapshot))
+    current, peak = tracemalloc.get_traced_memory()
+    result: Dict = {
+        "pid": os.getpid(),
+        "traced_current_bytes": current,
+        "traced_peak_bytes": peak,
+        "top": [
+            {"where": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics(group_by)[:top]
+        ],
+    }
+    if _snapshot is not None:
+        result["diff"] = [
+            {"where": str(stat.traceback), "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in snapshot.compare_to(_snapshot, group_by)[:top]
+        ]
+    _snapshot = snapshot
+    return result
+
+@router.post("/tracemalloc/stop", dependencies=[Depends(_session_worker)])
+async def tracemalloc_stop():
+    _stop_tracing()
+    return {"status": "OK", "pid": os.getpid(), "tracing": False}
+
+## ========================================------------========================================
+## ---------------------------------------- EVENT LOOP ---------------------------------------
+## ========================================------------========================================
+
+@_exclusive
+def _watch_loop(loop: asyncio.AbstractEventLoop, loop_thread: int, seconds: float, interval: float, threshold: float) -> Dict:
+    """Ping the loop from a thread; when a ping is late, capture what the loop thread is running"""
+    lags: List[float] = []
+    slow: Counter = Counter()
+    slow_total: Dict[str, float] = {}
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        answered = threading.Event()
+        sent = time.perf_counter()
+        loop.call_soon_threadsafe(answered.set)
+        stack = None
+        if not answered.wait(threshold):
+            # Still blocked: whatever is on the loop thread's stack right now is the slow callback
+            frame = sys._current_frames().get(loop_thread)
+            stack = _collapse(frame) if frame is not None else "<unknown>"
+            answered.wait(max(deadline - time.perf_counter(), 0) + 30)
+        lag = time.perf_counter() - sent
+        lags.append(lag)
+        if stack is not None:
+            slow[stack] += 1
+            slow_total[stack] = slow_total.get(stack, 0.0) + lag
+        time.sleep(interval)
+
+    lags_ms = sorted(lag * 1000 for lag in lags)
+    quantiles = statistics.quantiles(lags_ms, n=100) if len(lags_ms) > 1 else lags_ms * 99
+    return {
+        "pid": os.getpid(),
+        "samples": len(lags_ms),
+        "lag_ms": {
+            "mean": statistics.fmean(lags_ms) if lags_ms else 0.0,
+            "p50": quantiles[49] if quantiles else 0.0,
+            "p99": quantiles[98] if quantiles else 0.0,
+            "max": lags_ms[-1] if lags_ms else 0.0,
+        },
+        "slow_callbacks": [
+            {"stack": stack, "count": count, "total_ms": slow_total[stack] * 1000}
+            for stack, count in slow.most_common()
+        ],
+    }
+
+@router.get("/loop")
+async def event_loop_stats(
+    seconds: float = Query(10.0, gt=0, le=120),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    threshold_ms: float = Query(50.0, ge=1)
+):
+    """Event-loop lag percentiles and the stacks that blocked the loop longer than `threshold_ms`"""
+    loop = asyncio.get_running_loop()
+    return await asyncio.to_thread(
+        _watch_loop, loop, threading.get_ident(), seconds, interval_ms / 1000, threshold_ms / 1000
+    )
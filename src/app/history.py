@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import os
+from typing import Any, Dict, List, Optional
+from Utils.Classes.StructuredLogger import Log
+from Utils.Defs.lazy_import import lazy_import
+from .channels import DEFAULT_CHANNEL_ID
+from .models import ProviderMessage, TextContent
+
+# numpy and the embedder are only loaded when history indexing is enabled
+vector_index = lazy_import("Utils.Classes.VectorIndex")
+cached_embedder = lazy_import("Utils.Classes.CachedBatchEmbedder")
+
+# "" (off), "hashing" (local stand-in), or a model_configurator type: "embedder_jp" / "embedder_eng"
+HISTORY_EMBEDDER = os.getenv("HISTORY_EMBEDDER", "")
+HISTORY_DIR = os.getenv("HISTORY_DIR", "./build/history")
+
+def create_embeddings(name: str):
+    """Build the LangChain embeddings backend named by HISTORY_EMBEDDER"""
+    if name == "hashing":
+        from Utils.Classes.HashingEmbeddings import HashingEmbeddings
+        return HashingEmbeddings()
+    from Utils.Defs.model_configurator import get_configured_model
+    return get_configured_model(name, os.getenv("MODEL_CONFIG_FILE", "./Configs/Default.ModelConfig.jsonc"))
+
+class ChatHistoryIndexer:
+    """Incremental per-user chat-history index.
+
+    `submit` only enqueues; a background task drains the queue in micro-batches
+    (up to `max_batch` messages, waiting at most `max_wait` seconds to fill one),
+    embeds them with a content-hash cache and appends them to each user's index.
+    """
+
+    def __init__(self, embeddings, root: str, max_batch: int = 32, max_wait: float = 0.05, queue_size: int = 1000):
+        self.embedder = cached_embedder.CachedBatchEmbedder(embeddings, max_batch=max_batch)
+        self.root = root
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    def _index(self, channel_id: str, user_id: str, dim: int):
+        # Hashed directory names: user ids never appear in paths
+        user_key = hashlib.sha256(f"{channel_id}:{user_id}".encode("utf-8")).hexdigest()[:32]
+        return vector_index.VectorIndex(os.path.join(self.root, user_key), dim)
+
+    def submit(self, provider_message: ProviderMessage, role: str = "user") -> None:
+        """Queue a text message for indexing without waiting for it"""
+        if self._queue is None or not isinstance(provider_message.content, TextContent):
+            return
+        try:
+            self._queue.put_nowait((provider_message, role))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _next_batch(self) -> List[tuple]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: List[tuple]) -> None:
+        vectors = await self.embedder.aembed_documents([message.content.text for message, _ in batch])
+        groups: Dict[tuple, List[int]] = {}
+        for row, (message, _) in enumerate(batch):
+            channel_id = (message.metadata or {}).get("channel_id", DEFAULT_CHANNEL_ID)
+            groups.setdefault((channel_id, message.user_id), []).append(row)
+        for (channel_id, user_id), rows in groups.items():
+            metadatas = [{
+                "message_id": batch[row][0].message_id,
+                "role": batch[row][1],
+                "text": batch[row][0].content.text,
+                "timestamp": batch[row][0].timestamp.isoformat(),
+            } for row in rows]
+            index = self._index(channel_id, user_id, vectors.shape[1])
+            # File appends happen off the event loop
+            await asyncio.to_thread(index.add, vectors[rows], metadatas)
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            except Exception as e:
+                Log["Dramatic"]["error"]("Error indexing chat history:", str(e))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(self.queue_size)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Flush what is queued (bounded by `timeout`), then stop the background task"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            Log["Dramatic"]["warning"]("Chat history indexer stopped with pending messages:", self._queue.qsize())
+        self._task.cancel()
+        self._task = None
+        self._queue = None
+
+    async def search(self, channel_id: str, user_id: str, query: str, k: int = 4) -> List[Dict[str, Any]]:
+        """Top-k past messages for one user, most similar first"""
+        vector = await self.embedder.aembed_query(query)
+        index = self._index(channel_id, user_id, vector.shape[0])
+        return await asyncio.to_thread(index.search, vector, k)
+
+_history_indexer: Optional[ChatHistoryIndexer] = None
+
+def get_history_indexer() -> Optional[ChatHistoryIndexer]:
+    """The process-wide indexer, or None when HISTORY_EMBEDDER is unset"""
+    global _history_indexer
+    if _history_indexer is None and HISTORY_EMBEDDER:
+        _history_indexer = ChatHistoryIndexer(
+            create_embeddings(HISTORY_EMBEDDER),
+            os.path.join(HISTORY_DIR, HISTORY_EMBEDDER),
+            max_batch=int(os.getenv("HISTORY_MAX_BATCH", 32)),
+            max_wait=float(os.getenv("HISTORY_MAX_WAIT_SECONDS", 0.05)),
+        )
+    return _history_indexer
@@ -1,40 +1,46 @@
-from fastapi import FastAPI, Request, HTTPException
-from linebot.v3 import WebhookHandler
-from linebot.v3.messaging import (
-    ApiClient,
-    Configuration,
-    MessagingApi,  # This is the correct one
-    ReplyMessageRequest,
-    TextMessage
-)
-from linebot.v3.webhooks import MessageEvent, TextMessageContent
-from linebot.exceptions import InvalidSignatureError
+from fastapi import FastAPI, Request, HTTPException, Depends
 import uvicorn
 import logging
 from starlette.middleware.base import BaseHTTPMiddleware
 import os
 from dotenv import load_dotenv
+import importlib
 import json
-import ssl
-import socket
-from dramatic_logger import DramaticLogger
-from .LangserveRouter import route_line_message, send_line_message
-from .models import ProviderMessage  # Changed from .ProviderMessage to .models
+import uuid
+from typing import Optional, Union
+from datetime import datetime
+from Utils.Classes.StructuredLogger import Log, configure_logging, request_id_var
+from .LangserveRouter import (
+    route_line_events,
+    send_line_message,
+    get_receive_chain,
+    get_send_chain,
+    close_clients
+)
+from .models import (  # Changed from .ProviderMessage to .models
+    ProviderMessage,
+    CompactReplyMessage,
+    TextContent,
+    LineChannelConfig,
+    HistorySearchRequest
+)
+from .reply_registry import reply_registry
+from .channels import LineChannel, channel_registry, DEFAULT_CHANNEL_ID
+from .history import get_history_indexer
+from .state import shared_state
+from .admin import require_admin, require_history_token
+from .diagnostics import router as diagnostics_router
+
 
 # Load environment variables
 load_dotenv()
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+# Set up logging: queue-backed JSON lines, written from a background thread
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# LINE API setup
-configuration = Configuration(
-    access_token=os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
-)
-client = ApiClient(configuration)
-line_bot_api = MessagingApi(client)  # Initialize with API client
-handler = WebhookHandler(os.getenv('LINE_CHANNEL_SECRET'))
+DEDUP_TTL_SECONDS = float(os.getenv("LINE_DEDUP_TTL_SECONDS", 600))
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", 8))
 
 app = FastAPI()
 
@@ -43,23 +49,28 @@ app = FastAPI()
 ## ---------------------------------------- MIDDLEWARE ---------------------------------------
 ## ========================================------------========================================
 
+# Never written to the log sink, even at DEBUG
+REDACTED_HEADERS = {"authorization", "proxy-authorization", "cookie", "x-line-signature"}
+
+def _redact_headers(headers) -> dict:
+    return {name: "<redacted>" if name.lower() in REDACTED_HEADERS else value for name, value in headers.items()}
+
 # Middleware to log all requests and responses
 class LoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
-        DramaticLogger["Normal"]["info"](f"[LLM-Host] Request: {request.method} {request.url}")
-        if request.method == "POST":
+        # Correlation id for every log record emitted while handling this request
+        request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        request_id_var.set(request_id)
+        Log["Normal"]["info"]("[LLM-Host] Request:", request.method, request.url.path)
+        if request.method == "POST" and logger.isEnabledFor(logging.DEBUG):
             body = await request.body()
             try:
-                body_str = body.decode('utf-8')
-                # Parse the JSON string back into a Python object
-                body_obj = json.loads(body_str)
-                # Convert back to JSON with ensure_ascii=False to preserve unicode
-                pretty_body = json.dumps(body_obj, ensure_ascii=False, indent=2)
-                DramaticLogger["Dramatic"]["debug"]("[LLM-Host] Request Body:", pretty_body)
+                # Hand the parsed body to the sink; pretty-printing happens off the event loop
+                Log["Dramatic"]["debug"]("[LLM-Host] Request Body:", json.loads(body.decode('utf-8')))
             except UnicodeDecodeError:
-                DramaticLogger["Dramatic"]["warning"]("[LLM-Host] Could not decode request body.")
+                Log["Dramatic"]["warning"]("[LLM-Host] Could not decode request body.")
             except json.JSONDecodeError:
-                DramaticLogger["Dramatic"]["warning"]("[LLM-Host] Could not parse request body as JSON.")
+                Log["Dramatic"]["warning"]("[LLM-Host] Could not parse request body as JSON.")
             
             # Reassign the body so downstream can read it
             async def receive():
@@ -67,84 +78,245 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             request = Request(scope=request.scope, receive=receive)
         
         if request.method == "GET": # Development debugging only; avoid logging in production. This can reveal sensitive information, particularly API keys.
-            headers = dict(request.headers)
-            DramaticLogger["Dramatic"]["debug"]("[LLM-Host] GET Request Headers:", headers)  # Development debugging only; avoid logging in production
+            Log["Dramatic"]["debug"]("[LLM-Host] GET Request Headers:", _redact_headers(request.headers))  # Development debugging only; avoid logging in production
         
         response = await call_next(request)
-        DramaticLogger["Normal"]["info"](f"[LLM-Host] Response: {response.status_code}")
+        response.headers["X-Request-ID"] = request_id
+        Log["Normal"]["info"]("[LLM-Host] Response:", response.status_code)
         return response
 
 app.add_middleware(LoggingMiddleware)
+app.include_router(diagnostics_router)
+
+## ========================================-----------========================================
+## ---------------------------------------- PIPELINES ---------------------------------------
+## ========================================-----------========================================
+
+@app.on_event("startup")
+async def load_channels():
+    """Load channels added at runtime, keep them in sync, and register the .env channel (if any)"""
+    await channel_registry.start()
+    await channel_registry.load_env_default()
+
+_pipelines_compiled = False
+
+# Deferred when src.app.main is imported, but used by the first webhook/reply:
+# load them here so that cost never lands on the event loop under live traffic
+HOT_PATH_MODULES = ["linebot.v3.webhooks", "linebot.v3.messaging"]
+
+def build_pipelines():
+    """Build the receive/send pipelines, expose them through LangServe and import the
+    modules they use on the hot path (idempotent).
+
+    `serve.py` calls this in the supervisor before forking so LangServe/LangChain/LINE SDK
+    pages are shared copy-on-write; a single `uvicorn` process builds them at startup instead.
+    """
+    global _pipelines_compiled
+    if _pipelines_compiled:
+        return
+    for name in HOT_PATH_MODULES:
+        importlib.import_module(name)
+    from langserve import add_routes
+    # Schemas only: invoking these directly would bypass signature checks
+    observability_endpoints = ["input_schema", "output_schema", "config_schema"]
+    add_routes(app, get_receive_chain(), path="/pipelines/receive", enabled_endpoints=observability_endpoints)
+    add_routes(app, get_send_chain(), path="/pipelines/send", enabled_endpoints=observability_endpoints)
+    _pipelines_compiled = True
+
+@app.on_event("startup")
+async def compile_pipelines():
+    build_pipelines()
+
+@app.on_event("startup")
+async def start_history_indexer():
+    indexer = get_history_indexer()
+    if indexer is not None:
+        indexer.start()
+
+@app.on_event("shutdown")
+async def shutdown_pipelines():
+    indexer = get_history_indexer()
+    if indexer is not None:
+        await indexer.stop()
+    await close_clients()
 
 ## ========================================--------------========================================
 ## ---------------------------------------- LINE WEBHOOK ---------------------------------------
 ## ========================================--------------========================================
 
-@app.post("/")
-async def webhook(request: Request):
-    """Handle incoming LINE messages"""
+async def handle_line_webhook(channel: Optional[LineChannel], request: Request, body: bytes):
+    """Verify and route one webhook delivery for `channel`"""
     try:
-        # Get LINE signature and verify
+        # Get LINE signature and verify against this channel's secret
         signature = request.headers.get("X-Line-Signature")
         if not signature:
             raise HTTPException(status_code=401, detail="No signature")
-        
-        # Get request body
-        body = await request.body()
-        body_str = body.decode('utf-8')
-        
-        # Verify signature
-        handler.handle(body_str, signature)
+        if channel is None:
+            raise HTTPException(status_code=404, detail="Unknown channel")
+        if not channel.verify(body, signature):
+            raise HTTPException(status_code=401, detail="Invalid signature")
         
         # Parse webhook body
-        body_json = json.loads(body_str)
+        body_json = json.loads(body)
         events = body_json.get("events", [])
         
+        # Filter the batch before it enters the pipeline; responses keep the batch's event order
         responses = []
+        routed = []
+        slots = []
+        claimed = []
         for event in events:
             if event["type"] == "message":
-                message_event = MessageEvent.from_dict(event)
-                # Just route to orchestrator and return success
-                response = await route_line_message(message_event, line_bot_api)
-                responses.append(response)
-        
+                # LINE redelivers on timeouts; any worker may receive the retry
+                event_id = event.get("webhookEventId")
+                dedup_key = f"line:event:{event_id}" if event_id else None
+                if dedup_key and await shared_state.aseen(dedup_key, DEDUP_TTL_SECONDS):
+                    responses.append({"status": "skipped", "message": "Duplicate webhook event"})
+                    continue
+                user_id = event.get("source", {}).get("userId")
+                user_key = f"line:{channel.channel_id}:user:{user_id}"
+                if not await shared_state.ahit(user_key, channel.config.user_rate_limit, channel.config.user_rate_window):
+                    Log["Normal"]["warning"]("Rate limit exceeded for user", channel.channel_id, user_id)
+                    responses.append({"status": "skipped", "message": "Rate limit exceeded"})
+                    continue
+                routed.append(event)
+                slots.append(len(responses))
+                claimed.append(dedup_key)
+                responses.append(None)
+
+        # Route the rest through the receive pipeline, keeping per-user ordering across workers
+        if routed:
+            try:
+                results = await route_line_events(
+                    routed,
+                    channel_id=channel.channel_id,
+                    max_concurrency=WEBHOOK_MAX_CONCURRENCY,
+                    user_lock=lambda user_id: shared_state.user_lock(f"line:{channel.channel_id}:user:{user_id}")
+                )
+            except BaseException:
+                # Release the dedup claims so LINE's redelivery is processed instead of skipped
+                for dedup_key in filter(None, claimed):
+                    await shared_state.aforget(dedup_key)
+                raise
+            failed = 0
+            for slot, dedup_key, result in zip(slots, claimed, results):
+                responses[slot] = result
+                if result.get("status") == "error":
+                    failed += 1
+                    # Only the failed events are retried; the others stay deduplicated
+                    if dedup_key:
+                        await shared_state.aforget(dedup_key)
+            if failed:
+                Log["Dramatic"]["error"](f"[LLM-Host] {failed} of {len(routed)} webhook events failed; asking LINE to redeliver")
+                raise HTTPException(status_code=500, detail={"status": "error", "responses": responses})
+
         return {"status": "OK", "responses": responses}
         
-    except InvalidSignatureError:
-        raise HTTPException(status_code=401, detail="Invalid signature")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing webhook: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/")
+async def webhook(request: Request):
+    """Handle incoming LINE messages; the channel is picked by `destination`, else the default channel"""
+    body = await request.body()
+    try:
+        destination = json.loads(body).get("destination")
+    except (ValueError, AttributeError):
+        destination = None
+    channel = channel_registry.by_destination(destination) or channel_registry.get(None)
+    return await handle_line_webhook(channel, request, body)
+
+@app.post("/channels/{channel_id}")
+async def channel_webhook(channel_id: str, request: Request):
+    """Handle incoming LINE messages for one channel"""
+    body = await request.body()
+    return await handle_line_webhook(channel_registry.get(channel_id), request, body)
+
+async def expand_compact_reply(message: CompactReplyMessage) -> ProviderMessage:
+    """Rebuild a sendable ProviderMessage from the reply-token registry"""
+    entry = await reply_registry.get(message.message_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired message_id")
+    # Trusted, server-side data: skip re-validation
+    return ProviderMessage.model_construct(
+        provider="line",
+        message_id=message.message_id,
+        user_id=entry.user_id,
+        reply_token=entry.reply_token,
+        timestamp=datetime.fromtimestamp(entry.issued_at),
+        content=TextContent.model_construct(type="text", raw_content={}, text=message.text),
+        metadata={"channel_id": entry.channel_id}
+    )
+
 @app.post("/send")
-async def send_message(message: ProviderMessage):
-    """Handle outgoing messages from orchestrator to LINE"""
+async def send_message(message: Union[CompactReplyMessage, ProviderMessage]):
+    """Handle outgoing messages from orchestrator to LINE.
+
+    Accepts either a full ProviderMessage or a compact {message_id, text} reply.
+    """
     try:
-        DramaticLogger["Normal"]["info"](f"Received message from orchestrator: {message.model_dump()}")
-        return await send_line_message(message)
+        Log["Normal"]["info"]("Received message from orchestrator", message)
+        if isinstance(message, CompactReplyMessage):
+            message = await expand_compact_reply(message)
+        response = await send_line_message(message)
+        # Reply tokens are single-use
+        await reply_registry.discard(message.message_id)
+        indexer = get_history_indexer()
+        if indexer is not None:
+            indexer.submit(message, role="assistant")
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
-        DramaticLogger["Dramatic"]["error"](f"Error sending message: {str(e)}")
-        DramaticLogger["Normal"]["error"](f"Error details: {e.__dict__}")
+        Log["Dramatic"]["error"]("Error sending message:", str(e))
+        Log["Normal"]["error"]("Error details:", e.__dict__)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def handle_text_message(event):
-    # Log message details
-    print(f"Message: {event.message}")
-    print(f"From user: {event.source.user_id}")
-    print(f"Reply token: {event.reply_token}")
-    print(f"Timestamp: {event.timestamp}")
+@app.post("/history/search", dependencies=[Depends(require_history_token)])
+async def search_history(request: HistorySearchRequest):
+    """Top-k past messages for a user, for the orchestrator's retrieval step"""
+    indexer = get_history_indexer()
+    if indexer is None:
+        raise HTTPException(status_code=404, detail="Chat-history indexing is disabled")
+    results = await indexer.search(request.channel_id or DEFAULT_CHANNEL_ID, request.user_id, request.query, request.k)
+    return {"results": results}
 
-    try:
-        # Reply using v3 API
-        line_bot_api.reply_message(
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=event.message.text, type="text")]
-            )
-        )
-    except Exception as e:
-        logger.error(f"Error sending reply: {e}")
-        raise
+@app.get("/health")
+async def health():
+    """Liveness probe; also used by the worker scaling benchmark"""
+    return {"status": "OK", "pid": os.getpid()}
+
+## ========================================----------------========================================
+## ---------------------------------------- CHANNEL ADMIN ---------------------------------------
+## ========================================----------------========================================
+
+@app.get("/admin/channels", dependencies=[Depends(require_admin)])
+async def list_channels():
+    """List registered channels (secrets and tokens are never returned)"""
+    return [
+        config.model_dump(exclude={"channel_secret", "access_token"})
+        for config in channel_registry.list()
+    ]
+
+@app.put("/admin/channels/{channel_id}", dependencies=[Depends(require_admin)])
+async def put_channel(channel_id: str, config: LineChannelConfig):
+    """Add or replace a channel at runtime; every worker picks it up without a restart"""
+    if config.channel_id != channel_id:
+        raise HTTPException(status_code=400, detail="channel_id in path and body must match")
+    await channel_registry.add(config)
+    Log["Normal"]["info"]("Registered LINE channel", channel_id)
+    return {"status": "OK", "channel_id": channel_id}
+
+@app.delete("/admin/channels/{channel_id}", dependencies=[Depends(require_admin)])
+async def delete_channel(channel_id: str):
+    """Remove a channel at runtime"""
+    if not await channel_registry.remove(channel_id):
+        raise HTTPException(status_code=404, detail="Unknown channel")
+    Log["Normal"]["info"]("Removed LINE channel", channel_id)
+    return {"status": "OK", "channel_id": channel_id}
 
 if __name__ == "__main__":
     port = int(os.getenv("APP_PORT", 50005))
@@ -68,4 +68,25 @@ class ProviderMessage(BaseModel):
     thread_id: Optional[str] = None
     reply_to: Optional[str] = None
     mentions: Optional[List[str]] = None
-    metadata: Optional[Dict[str, Any]] = None 
\ No newline at end of file
+    metadata: Optional[Dict[str, Any]] = None 
+
+class CompactReplyMessage(BaseModel):
+    """Reply from the orchestrator that references an incoming message instead of echoing it"""
+    message_id: str = Field(description="message_id of the incoming ProviderMessage being answered")
+    text: str = Field(description="Reply text")
+
+class LineChannelConfig(BaseModel):
+    """One LINE official account served by this process"""
+    channel_id: str = Field(description="Routing key; webhooks for this channel arrive at /channels/{channel_id}")
+    channel_secret: str = Field(description="Channel secret used to verify X-Line-Signature")
+    access_token: str = Field(description="Channel access token for the Messaging API")
+    destination: Optional[str] = Field(default=None, description="Bot user ID sent as `destination` in webhooks")
+    user_rate_limit: int = Field(default=30, description="Messages per user per window")
+    user_rate_window: float = Field(default=60.0, description="Rate-limit window in seconds")
+
+class HistorySearchRequest(BaseModel):
+    """Chat-history retrieval request from the orchestrator"""
+    user_id: str
+    query: str
+    k: int = Field(default=4, ge=1, le=50)
+    channel_id: Optional[str] = None
@@ -0,0 +1,49 @@
+import json
+import os
+import time
+from typing import NamedTuple, Optional
+from Utils.Classes.TimingWheel import TimingWheel
+from .state import shared_state
+
+# LINE reply tokens are only valid for a short time after the webhook event
+REPLY_TOKEN_TTL_SECONDS = float(os.getenv("LINE_REPLY_TOKEN_TTL_SECONDS", 60))
+
+class ReplyEntry(NamedTuple):
+    reply_token: str
+    user_id: str
+    channel_id: str
+    issued_at: float
+
+class ReplyTokenRegistry:
+    """message_id -> reply token, so /send can accept just a message_id and content.
+
+    Entries live in an in-process timing wheel and are always written through to
+    shared state: whether other worker processes exist (serve.py, `uvicorn --workers`,
+    gunicorn) cannot be told reliably from inside a worker, and the reply may arrive
+    on any of them. Shared-state calls run off the event loop.
+    """
+
+    _key_prefix = "line:reply:"
+
+    def __init__(self, ttl: float = REPLY_TOKEN_TTL_SECONDS):
+        self.ttl = ttl
+        self._wheel = TimingWheel(max_ttl=ttl)
+
+    async def register(self, message_id: str, reply_token: str, user_id: str, channel_id: str) -> None:
+        entry = ReplyEntry(reply_token, user_id, channel_id, time.time())
+        self._wheel.put(message_id, entry)
+        await shared_state.aset(self._key_prefix + message_id, json.dumps(entry), ttl=self.ttl)
+
+    async def get(self, message_id: str) -> Optional[ReplyEntry]:
+        entry = self._wheel.get(message_id)
+        if entry is None:
+            raw = await shared_state.aget(self._key_prefix + message_id)
+            entry = ReplyEntry(*json.loads(raw)) if raw else None
+        return entry
+
+    async def discard(self, message_id: str) -> None:
+        """Forget a token once it has been used (reply tokens are single-use)"""
+        self._wheel.pop(message_id)
+        await shared_state.adelete(self._key_prefix + message_id)
+
+reply_registry = ReplyTokenRegistry()
@@ -0,0 +1,171 @@
+"""Production entry point: N preloaded uvicorn workers sharing one port via SO_REUSEPORT.
+
+Usage:
+    python -m src.app.serve --workers 4 --port 50005
+    python -m src.app.serve --profile-startup
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+import uvicorn
+from Utils.Classes.StructuredLogger import Log, shutdown_logging
+
+# Exit status of a worker whose app failed to start (same code uvicorn's CLI uses)
+STARTUP_FAILURE_STATUS = 3
+# A worker that dies within this many seconds of spawning counts as a rapid failure
+RAPID_FAILURE_SECONDS = 10.0
+# Give up after this many rapid failures in a row instead of crash-looping forever
+MAX_RAPID_FAILURES = 5
+MAX_RESPAWN_BACKOFF_SECONDS = 30.0
+
+## ========================================---------========================================
+## ---------------------------------------- WORKERS ---------------------------------------
+## ========================================---------========================================
+
+def _bind_reuseport(host: str, port: int, backlog: int) -> socket.socket:
+    """Create a listening socket that the kernel load-balances across workers."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def _run_worker(app, args) -> bool:
+    """Worker body: own socket, own event loop; uvicorn drains in-flight requests on SIGTERM.
+
+    Returns False when the app never started (e.g. a startup hook raised).
+    """
+    sock = _bind_reuseport(args.host, args.port, args.backlog)
+    config = uvicorn.Config(
+        app,
+        log_level=args.log_level,
+        log_config=None,  # Keep the app's queue-backed logging sink
+        timeout_graceful_shutdown=args.drain_timeout,
+        timeout_keep_alive=args.keep_alive,
+    )
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    return server.started
+
+def _spawn(app, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        # Child: restore default signal dispositions before uvicorn installs its own
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        status = 1
+        try:
+            status = 0 if _run_worker(app, args) else STARTUP_FAILURE_STATUS
+        except BaseException as e:
+            Log["Dramatic"]["error"](f"[Serve] Worker {os.getpid()} crashed:", repr(e))
+        finally:
+            shutdown_logging()
+            os._exit(status)
+    return pid
+
+## ========================================------------========================================
+## ---------------------------------------- SUPERVISOR ---------------------------------------
+## ========================================------------========================================
+
+def serve(args) -> int:
+    """Preload the app, fork the workers, respawn crashes and drain everything on SIGTERM.
+
+    Respawns back off exponentially; after MAX_RAPID_FAILURES workers in a row die
+    within RAPID_FAILURE_SECONDS of starting, the supervisor stops and returns 1.
+    """
+    # Preload once in the supervisor so workers share the imported code pages (copy-on-write),
+    # including LangServe, the LINE SDK and the compiled pipelines that the startup hook would otherwise build per worker
+    from .main import app, build_pipelines
+    build_pipelines()
+
+    workers = {_spawn(app, args): time.monotonic() for _ in range(args.workers)}
+    Log["Normal"]["info"](f"[Serve] Started {len(workers)} workers on {args.host}:{args.port}")
+
+    stopping = False
+    exit_code = 0
+    rapid_failures = 0
+    respawn_at = []  # monotonic due times of pending respawns
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    while not stopping:
+        now = time.monotonic()
+        for due in [due for due in respawn_at if due <= now]:
+            respawn_at.remove(due)
+            workers[_spawn(app, args)] = now
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            if not respawn_at:
+                break
+            pid = 0
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        started = workers.pop(pid, now)
+        code = os.waitstatus_to_exitcode(status)
+        if now - started < RAPID_FAILURE_SECONDS:
+            rapid_failures += 1
+        else:
+            rapid_failures = 0
+        if rapid_failures >= MAX_RAPID_FAILURES:
+            Log["Dramatic"]["error"](f"[Serve] Worker {pid} exited ({code}); {rapid_failures} rapid failures in a row, giving up")
+            stopping = True
+            exit_code = 1
+            break
+        delay = min(0.5 * 2 ** rapid_failures, MAX_RESPAWN_BACKOFF_SECONDS) if rapid_failures else 0.0
+        Log["Dramatic"]["warning"](f"[Serve] Worker {pid} exited ({code}); respawning in {delay:.1f}s")
+        respawn_at.append(now + delay)
+
+    Log["Normal"]["info"](f"[Serve] Draining {len(workers)} workers")
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    deadline = time.monotonic() + args.drain_timeout + 5
+    while workers and time.monotonic() < deadline:
+        for pid in list(workers):
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done:
+                workers.pop(pid)
+        time.sleep(0.1)
+
+    for pid in workers:
+        Log["Dramatic"]["warning"](f"[Serve] Worker {pid} did not drain in time; killing")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    return exit_code
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the LINE integration with multiple workers")
+    parser.add_argument("--host", default=os.getenv("APP_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("APP_PORT", 50005)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("APP_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--drain-timeout", type=int, default=int(os.getenv("APP_DRAIN_TIMEOUT", 30)))
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--log-level", default=os.getenv("APP_LOG_LEVEL", "info"))
+    parser.add_argument("--profile-startup", action="store_true", help="Report cold-start import time and RSS, then exit")
+    parser.add_argument("--check-startup-budget", action="store_true", help="Like --profile-startup, but exit 1 when over budget")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = _parse_args()
+    if args.profile_startup or args.check_startup_budget:
+        from .startup_profile import main as profile_startup
+        sys.exit(profile_startup(check=args.check_startup_budget))
+    if not hasattr(socket, "SO_REUSEPORT"):
+        sys.exit("SO_REUSEPORT is not available on this platform; use _START_APPLICATION.sh instead")
+    sys.exit(serve(args))
@@ -0,0 +1,123 @@
+"""Cold-start profiling and budget check for `src.app.main`.
+
+Usage:
+    python -m src.app.serve --profile-startup         # report import + startup time, RSS and top imports
+    python -m src.app.serve --check-startup-budget    # exit 1 if the cold start is over budget
+"""
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules that must stay deferred at import time (see Utils/Defs/lazy_import.py)
+DEFERRED_MODULES = [
+    "langchain",
+    "langchain_core.runnables",
+    "langchain_openai",
+    "langchain_nvidia_ai_endpoints",
+    "linebot.v3.webhooks",
+]
+
+# Runs in a fresh interpreter so nothing is already cached in sys.modules. The app is
+# started through its lifespan (startup hooks included), as a worker would run it.
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import src.app.main
+imported = time.perf_counter()
+from Utils.Defs.lazy_import import is_loaded
+loaded = [name for name in json.loads(sys.argv[1]) if is_loaded(name)]
+from fastapi.testclient import TestClient
+client = TestClient(src.app.main.app)
+client_ready = time.perf_counter()
+client.__enter__()
+ready = time.perf_counter()
+with open("/proc/self/statm") as f:
+    rss_pages = int(f.read().split()[1])
+client.__exit__(None, None, None)
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - client_ready) * 1000,
+    "total_ms": (imported - started + ready - client_ready) * 1000,
+    "rss_mb": rss_pages * resource.getpagesize() / 2**20,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": loaded,
+}))
+"""
+
+# Top-level imports made by the probe itself rather than by the app
+_PROBE_IMPORTS = {"json", "resource", "src", "src.app", "src.app.main", "fastapi.testclient"}
+
+def _parse_importtime(stderr: str) -> List[Dict]:
+    """Parse `python -X importtime` output into {module, self_us, cumulative_us, depth} rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({
+            "module": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+        })
+    return rows
+
+def measure(runs: int = 3) -> Dict:
+    """Cold-start `src.app.main` (import + lifespan startup) `runs` times and keep the fastest run."""
+    best = None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _PROBE, json.dumps(DEFERRED_MODULES)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        report["imports"] = _parse_importtime(result.stderr)
+        if best is None or report["total_ms"] < best["total_ms"]:
+            best = report
+    return best
+
+def print_report(report: Dict, top: int = 20) -> None:
+    print(f"Cold start of src.app.main: {report['total_ms']:.1f} ms "
+          f"(import {report['import_ms']:.1f} ms + startup hooks {report['startup_ms']:.1f} ms)")
+    print(f"RSS after startup: {report['rss_mb']:.1f} MiB (peak {report['max_rss_mb']:.1f} MiB)")
+    print(f"\nTop {top} direct imports (of src.app.main and its startup hooks) by cumulative time:")
+    # importtime nests each module's own imports one level below it; src.app.main sits at depth 0,
+    # while imports made inside startup hooks are top-level (depth 0) themselves
+    top_level = [
+        row for row in report["imports"]
+        if row["depth"] == 1 or (row["depth"] == 0 and row["module"] not in _PROBE_IMPORTS)
+    ]
+    for row in sorted(top_level, key=lambda r: r["cumulative_us"], reverse=True)[:top]:
+        print(f"  {row['cumulative_us'] / 1000:9.1f} ms  {row['module']}")
+    print(f"\nTop {top} modules by self time:")
+    for row in sorted(report["imports"], key=lambda r: r["self_us"], reverse=True)[:top]:
+        print(f"  {row['self_us'] / 1000:9.1f} ms  {row['module']}")
+    if report["loaded"]:
+        print(f"\nDeferred modules loaded at import time: {', '.join(report['loaded'])}")
+
+def check_budget(report: Dict) -> List[str]:
+    """Return a list of budget violations (empty when the cold start is within budget)."""
+    budget_ms = float(os.getenv("STARTUP_BUDGET_MS", 3000))
+    budget_rss_mb = float(os.getenv("STARTUP_BUDGET_RSS_MB", 150))
+    failures = []
+    if report["total_ms"] > budget_ms:
+        failures.append(f"cold start {report['total_ms']:.1f} ms > budget {budget_ms:.0f} ms")
+    if report["rss_mb"] > budget_rss_mb:
+        failures.append(f"RSS {report['rss_mb']:.1f} MiB > budget {budget_rss_mb:.0f} MiB")
+    for name in report["loaded"]:
+        failures.append(f"{name} is imported eagerly but should be deferred")
+    return failures
+
+def main(check: bool = False) -> int:
+    report = measure()
+    print_report(report)
+    if not check:
+        return 0
+    failures = check_budget(report)
+    for failure in failures:
+        print(f"STARTUP BUDGET EXCEEDED: {failure}", file=sys.stderr)
+    return 1 if failures else 0
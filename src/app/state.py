@@ -0,0 +1,8 @@
+import os
+from dotenv import load_dotenv
+from Utils.Classes.SharedState import SharedState
+
+load_dotenv()
+
+# Cross-worker state (dedup, rate limits, per-user ordering, channel registry); opened lazily in each worker
+shared_state = SharedState(os.getenv("SHARED_STATE_PATH", "./build/state/shared_state.sqlite3"))
@@ -0,0 +1,73 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("langserve")
+pytest.importorskip("linebot.v3")
+
+from fastapi.testclient import TestClient
+
+class FakeApiClient:
+    async def close(self):
+        pass
+
+class FakeMessagingApi:
+    def __init__(self):
+        self.api_client = FakeApiClient()
+        self.replies = []
+
+    async def reply_message(self, request):
+        self.replies.append(request)
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    from src.app.main import app
+    from src.app.state import shared_state
+    # Fresh database per test; the connection is reopened on next use
+    monkeypatch.setattr(shared_state, "path", str(tmp_path / "shared_state.sqlite3"))
+    monkeypatch.setattr(shared_state, "_pid", None)
+    monkeypatch.setenv("ADMIN_TOKEN", "admin-test-token")
+    monkeypatch.delenv("LINE_CHANNEL_SECRET", raising=False)
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def line_api(client):
+    from src.app.channels import channel_registry
+    response = client.put(
+        "/admin/channels/test",
+        headers={"Authorization": "Bearer admin-test-token"},
+        json={"channel_id": "test", "channel_secret": "secret", "access_token": "token"},
+    )
+    assert response.status_code == 200
+    api = FakeMessagingApi()
+    channel_registry.get("test")._api = api
+    return api
+
+def _register(client, message_id: str) -> None:
+    from src.app.reply_registry import reply_registry
+    client.portal.call(reply_registry.register, message_id, f"reply-token-{message_id}", "U1", "test")
+
+def test_compact_reply_is_sent_once(client, line_api):
+    _register(client, "m1")
+    response = client.post("/send", json={"message_id": "m1", "text": "こんにちは"})
+    assert response.status_code == 200
+    assert len(line_api.replies) == 1
+    assert line_api.replies[0].reply_token == "reply-token-m1"
+    assert line_api.replies[0].messages[0].text == "こんにちは"
+
+    # Reply tokens are single-use
+    response = client.post("/send", json={"message_id": "m1", "text": "again"})
+    assert response.status_code == 404
+    assert len(line_api.replies) == 1
+
+def test_compact_reply_falls_back_to_shared_state(client, line_api):
+    from src.app.reply_registry import reply_registry
+    _register(client, "m2")
+    # As if the webhook had been received by another worker
+    reply_registry._wheel.pop("m2")
+    response = client.post("/send", json={"message_id": "m2", "text": "hi"})
+    assert response.status_code == 200
+    assert line_api.replies[0].reply_token == "reply-token-m2"
+
+def test_unknown_message_id_is_404(client, line_api):
+    assert client.post("/send", json={"message_id": "missing", "text": "hi"}).status_code == 404
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("pydantic")
+
+from Utils.Classes.CachedBatchEmbedder import CachedBatchEmbedder
+from Utils.Classes.HashingEmbeddings import HashingEmbeddings
+from src.app.history import ChatHistoryIndexer
+from src.app.models import ProviderMessage, TextContent
+
+class CountingEmbeddings(HashingEmbeddings):
+    """HashingEmbeddings that records the size of every batch it is asked to embed"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        return super().embed_documents(texts)
+
+def _message(user_id: str, text: str, message_id: str) -> ProviderMessage:
+    return ProviderMessage(
+        provider="line",
+        message_id=message_id,
+        user_id=user_id,
+        timestamp=datetime(2024, 1, 1),
+        content=TextContent(raw_content={}, text=text),
+        metadata={"channel_id": "test"}
+    )
+
+def test_cached_embedder_embeds_repeated_texts_once():
+    embeddings = CountingEmbeddings(dim=32)
+    embedder = CachedBatchEmbedder(embeddings, max_batch=2)
+
+    first = asyncio.run(embedder.aembed_documents(["a", "b", "a", "c"]))
+    assert first.shape == (4, 32)
+    assert np.array_equal(first[0], first[2])
+    assert embeddings.batches == [2, 1]
+    assert (embedder.hits, embedder.misses) == (0, 3)
+
+    second = asyncio.run(embedder.aembed_documents(["c", "a"]))
+    assert np.array_equal(second, first[[3, 0]])
+    assert embeddings.batches == [2, 1]
+    assert (embedder.hits, embedder.misses) == (2, 3)
+
+def test_cached_embedder_evicts_least_recently_used():
+    embeddings = CountingEmbeddings(dim=32)
+    embedder = CachedBatchEmbedder(embeddings, cache_size=2)
+    asyncio.run(embedder.aembed_documents(["a", "b", "c"]))
+    asyncio.run(embedder.aembed_documents(["a"]))
+    assert embeddings.batches == [3, 1]
+
+def test_indexer_micro_batches_and_searches_per_user(tmp_path):
+    embeddings = CountingEmbeddings(dim=64)
+    indexer = ChatHistoryIndexer(embeddings, str(tmp_path), max_batch=4, max_wait=0.05)
+    texts = [f"message number {i}" for i in range(10)]
+
+    async def run():
+        indexer.start()
+        for i, text in enumerate(texts):
+            indexer.submit(_message("U1" if i % 2 else "U2", text, str(i)))
+        await indexer.stop()
+        return (
+            await indexer.search("test", "U1", texts[3], k=1),
+            await indexer.search("test", "U2", texts[3], k=5),
+        )
+
+    u1, u2 = asyncio.run(run())
+    # Ten messages queued at once are embedded in batches of at most max_batch
+    assert embeddings.batches == [4, 4, 2]
+    assert u1[0]["text"] == texts[3]
+    assert u1[0]["role"] == "user"
+    assert {result["text"] for result in u2} == set(texts[0::2])
+
+def test_indexer_ignores_submissions_before_start(tmp_path):
+    embeddings = CountingEmbeddings(dim=64)
+    indexer = ChatHistoryIndexer(embeddings, str(tmp_path))
+    indexer.submit(_message("U1", "hello", "1"))
+    assert embeddings.batches == []
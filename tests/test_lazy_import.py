@@ -0,0 +1,58 @@
+import sys
+import pytest
+from Utils.Defs.lazy_import import is_loaded, lazy_import
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    """Synthetic package: `lazypkg` eagerly imports `lazypkg.eager`; `lazypkg.lazy` is standalone"""
+    root = tmp_path / "lazypkg"
+    root.mkdir()
+    (root / "__init__.py").write_text("from . import eager\n")
+    for name in ("eager", "lazy"):
+        (root / f"{name}.py").write_text(
+            "import builtins\n"
+            f"builtins.lazypkg_runs.append({name!r})\n"
+            "VALUE = 42\n"
+        )
+    runs = []
+    monkeypatch.setattr("builtins.lazypkg_runs", runs, raising=False)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield runs
+    for name in [name for name in sys.modules if name == "lazypkg" or name.startswith("lazypkg.")]:
+        del sys.modules[name]
+
+def test_submodule_imported_by_parent_runs_once(package):
+    module = lazy_import("lazypkg.eager")
+    import lazypkg
+    assert package == ["eager"]
+    assert is_loaded("lazypkg.eager")
+    assert module.VALUE == 42
+    assert lazypkg.eager.VALUE == 42
+    assert package == ["eager"]
+
+def test_lazy_module_runs_once_on_first_access(package):
+    import lazypkg
+    module = lazy_import("lazypkg.lazy")
+    assert package == ["eager"]
+    assert not is_loaded("lazypkg.lazy")
+    assert module is lazypkg.lazy
+
+    assert module.VALUE == 42
+    assert is_loaded("lazypkg.lazy")
+    import lazypkg.lazy
+    assert lazypkg.lazy is module
+    assert package == ["eager", "lazy"]
+
+def test_unimported_parent_is_not_touched(package):
+    module = lazy_import("lazypkg.eager")
+    assert package == []
+    assert not is_loaded("lazypkg")
+
+    assert module.VALUE == 42
+    assert package == ["eager"]
+    assert is_loaded("lazypkg.eager")
+
+def test_missing_module_raises(package):
+    import lazypkg  # noqa: F401
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import("lazypkg.missing")
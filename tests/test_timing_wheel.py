@@ -0,0 +1,69 @@
+from Utils.Classes.TimingWheel import TimingWheel
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+def _wheel(max_ttl: float = 10.0, tick: float = 1.0):
+    clock = FakeClock()
+    return TimingWheel(max_ttl=max_ttl, tick=tick, clock=clock), clock
+
+def test_entry_expires_exactly_at_ttl():
+    wheel, clock = _wheel()
+    wheel.put("k", "v", ttl=2.5)
+    clock.now += 2.4999
+    assert wheel.get("k") == "v"
+    clock.now += 0.0001
+    assert wheel.get("k") is None
+
+def test_ttl_is_capped_at_max_ttl():
+    wheel, clock = _wheel(max_ttl=10.0)
+    wheel.put("k", "v", ttl=60.0)
+    clock.now += 10.0
+    assert wheel.get("k") is None
+
+def test_replacing_a_key_keeps_only_the_new_entry():
+    wheel, clock = _wheel()
+    wheel.put("k", "old", ttl=2.0)
+    wheel.put("k", "new", ttl=8.0)
+    assert len(wheel) == 1
+    # The old entry's bucket passes without evicting the replacement
+    clock.now += 5.0
+    assert wheel.get("k") == "new"
+    assert len(wheel) == 1
+    clock.now += 3.0
+    assert wheel.get("k") is None
+
+def test_elapsed_buckets_are_reclaimed():
+    wheel, clock = _wheel(max_ttl=10.0)
+    for i in range(100):
+        wheel.put(i, i, ttl=1.0 + i % 9)
+    clock.now += 11.0
+    wheel.get("anything")
+    assert len(wheel) == 0
+
+def test_full_revolution_reclaims_every_bucket():
+    wheel, clock = _wheel(max_ttl=10.0)
+    for i in range(50):
+        clock.now += 0.3
+        wheel.put(i, i)
+    # Jump several revolutions ahead in one step
+    clock.now += 10 * wheel._slots
+    wheel.put("fresh", "v", ttl=5.0)
+    assert len(wheel) == 1
+    assert sum(len(bucket) for bucket in wheel._buckets) == 1
+    assert wheel.get("fresh") == "v"
+
+def test_pop_returns_live_entries_and_drops_expired_ones():
+    wheel, clock = _wheel()
+    wheel.put("live", 1, ttl=5.0)
+    wheel.put("stale", 2, ttl=0.5)
+    clock.now += 0.75
+    assert wheel.pop("stale") is None
+    assert wheel.pop("live") == 1
+    assert wheel.pop("live") is None
+    assert len(wheel) == 0
+    assert sum(len(bucket) for bucket in wheel._buckets) == 0
@@ -0,0 +1,53 @@
+import json
+import os
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from Utils.Classes.HashingEmbeddings import HashingEmbeddings
+from Utils.Classes.VectorIndex import VectorIndex
+
+TEXTS = ["明日は映画を見に行く", "the weather is nice today", "晩ご飯はカレーにしよう", "see you tomorrow"]
+
+@pytest.fixture
+def embeddings():
+    return HashingEmbeddings(dim=64)
+
+def _add(index, embeddings, texts):
+    index.add(np.array(embeddings.embed_documents(texts)), [{"text": text} for text in texts])
+
+def test_search_returns_best_match_first(tmp_path, embeddings):
+    index = VectorIndex(str(tmp_path), 64)
+    _add(index, embeddings, TEXTS)
+    assert len(index) == len(TEXTS)
+
+    results = index.search(np.array(embeddings.embed_query("映画を見に行く")), k=2)
+    assert [result["text"] for result in results][0] == TEXTS[0]
+    assert len(results) == 2
+    assert results[0]["score"] >= results[1]["score"]
+
+def test_appends_accumulate_across_instances(tmp_path, embeddings):
+    _add(VectorIndex(str(tmp_path), 64), embeddings, TEXTS[:2])
+    _add(VectorIndex(str(tmp_path), 64), embeddings, TEXTS[2:])
+    index = VectorIndex(str(tmp_path), 64)
+    assert len(index) == len(TEXTS)
+    assert index.search(np.array(embeddings.embed_query(TEXTS[3])), k=1)[0]["text"] == TEXTS[3]
+
+def test_empty_index(tmp_path, embeddings):
+    assert VectorIndex(str(tmp_path / "missing"), 64).search(np.array(embeddings.embed_query("x"))) == []
+
+def test_interrupted_append_is_repaired(tmp_path, embeddings):
+    index = VectorIndex(str(tmp_path), 64)
+    _add(index, embeddings, TEXTS[:2])
+    # Crash after metadata and offsets were written but before the vectors were
+    with open(os.path.join(tmp_path, "meta.jsonl"), "ab") as meta:
+        start = meta.tell()
+        meta.write(json.dumps({"text": "orphan"}).encode() + b"\n")
+    with open(os.path.join(tmp_path, "meta.idx"), "ab") as idx:
+        idx.write(np.array([start], dtype=np.uint64).tobytes())
+
+    _add(index, embeddings, TEXTS[2:])
+    assert len(index) == len(TEXTS)
+    for text in TEXTS:
+        assert index.search(np.array(embeddings.embed_query(text)), k=1)[0]["text"] == text